@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import time
+
+import numpy as np
+
+# -----------------------------------------------------------------------------
+# Price Alerts (价格提醒)
+# -----------------------------------------------------------------------------
+# alerts.json (与 stock_config.json 同目录):
+# {"alerts": [{"code": "600519", "type": "above", "value": 1800},
+#             {"code": "000001", "type": "move", "value": 2, "minutes": 5}]}
+#   above / below:         价格上穿 / 下穿
+#   pct_above / pct_below: 涨跌幅超过 / 低于 (%)
+#   move:                  N 分钟内涨跌幅绝对值超过 value (%)
+ALERTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alerts.json")
+ALERT_TYPES = ["above", "below", "pct_above", "pct_below", "move"]
+ABOVE, BELOW, PCT_ABOVE, PCT_BELOW, MOVE = range(len(ALERT_TYPES))
+DEFAULT_COOLDOWN = 300   # 同一条规则触发后至少间隔 5 分钟
+HISTORY_MINUTES = 60     # move 类规则最多回看 60 分钟
+
+
+def load_alerts(path=ALERTS_PATH):
+    """
+    读取 alerts.json，手工改坏的条目跳过并打印警告，不影响其他规则
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("alerts", [])
+    except Exception as e:
+        print(f"Error loading alerts: {e}")
+        return []
+    rules = []
+    for entry in entries if isinstance(entries, list) else []:
+        rule = _check_rule(entry)
+        if rule is None:
+            print(f"Skipping invalid alert: {entry!r}")
+        else:
+            rules.append(rule)
+    return rules
+
+
+def _check_rule(entry):
+    # 返回规范化后的规则，不合法返回 None
+    if not isinstance(entry, dict) or entry.get("type") not in ALERT_TYPES:
+        return None
+    code = entry.get("code")
+    if not isinstance(code, str) or not code:
+        return None
+    try:
+        rule = dict(entry, value=float(entry["value"]))
+        if "cooldown" in entry:
+            rule["cooldown"] = float(entry["cooldown"])
+        if rule["type"] == "move":
+            rule["minutes"] = min(max(int(entry.get("minutes", 5)), 1), HISTORY_MINUTES)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not np.isfinite(rule["value"]):
+        return None
+    return rule
+
+
+def save_alerts(rules, path=ALERTS_PATH):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"alerts": rules}, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"Error saving alerts: {e}")
+
+
+_RULE_RE = re.compile(r"^\s*(\w+)\s+(?:(\d+)m|(%))?\s*([<>])\s*(-?(?:\d+(?:\.\d*)?|\.\d+))\s*$")
+
+
+def parse_rule(text):
+    """
+    "600519 >1800"  价格上穿 1800
+    "600519 %<-5"   跌幅超过 5%
+    "600519 5m>2"   5 分钟内波动超过 2% (只能用 >)
+    解析失败返回 None
+    """
+    m = _RULE_RE.match(text)
+    if not m:
+        return None
+    code, minutes, pct, op, value = m.groups()
+    rule = {"code": code, "value": float(value)}
+    if minutes:
+        if op != ">":
+            return None
+        rule["type"] = "move"
+        rule["minutes"] = min(int(minutes), HISTORY_MINUTES)
+        rule["value"] = abs(rule["value"])
+    elif pct:
+        rule["type"] = "pct_above" if op == ">" else "pct_below"
+    else:
+        rule["type"] = "above" if op == ">" else "below"
+    return rule
+
+
+def describe_rule(rule):
+    t, v = rule["type"], rule["value"]
+    if t == "above":
+        return f"突破 {v:.2f}"
+    if t == "below":
+        return f"跌破 {v:.2f}"
+    if t == "pct_above":
+        return f"涨幅超过 {v:+.2f}%"
+    if t == "pct_below":
+        return f"涨幅低于 {v:+.2f}%"
+    return f"{rule.get('minutes', 5)} 分钟波动超过 {v:.2f}%"
+
+
+class _RuleSet:
+    # 规则列式存储，set_rules 时整体替换，evaluate 只读
+    def __init__(self, rules, key_func):
+        self.rules = rules
+        self.keys = sorted({key_func(r["code"]) for r in rules})
+        key_idx = {k: i for i, k in enumerate(self.keys)}
+        n = len(rules)
+        self.sym = np.array([key_idx[key_func(r["code"])] for r in rules], dtype=np.intp)
+        self.kind = np.array([ALERT_TYPES.index(r["type"]) for r in rules], dtype=np.int8)
+        self.value = np.array([float(r["value"]) for r in rules], dtype=float)
+        self.minutes = np.array([int(r.get("minutes", 5)) for r in rules], dtype=np.intp)
+        self.cooldown = np.array([float(r.get("cooldown", DEFAULT_COOLDOWN)) for r in rules], dtype=float)
+        # armed 在第一次拿到价格时按当时的条件设置：条件一开始就成立不算 "穿过"
+        self.seen = np.zeros(n, dtype=bool)
+        self.armed = np.zeros(n, dtype=bool)
+        self.last_fired = np.full(n, -np.inf)
+        # 每分钟一个采样槽，move 规则取 N 分钟前的槽位
+        self.hist = np.full((len(self.keys), HISTORY_MINUTES + 1), np.nan)
+        self.last_minute = None
+        # keys 在行情表里的行号，行情表布局变化时重新计算
+        self.layout = None
+        self.rows = None
+
+    def rule_id(self, i, key_func):
+        r = self.rules[i]
+        minutes = int(r.get("minutes", 5)) if r["type"] == "move" else None
+        return key_func(r["code"]), r["type"], float(r["value"]), minutes
+
+    def inherit(self, old, key_func):
+        """
+        沿用旧规则集里同一条规则 (代码, 类型, 阈值, 分钟数) 的触发状态和
+        同一代码的分钟价格，增删别的规则时不会让已有规则重新触发
+        """
+        old_ids = {}
+        for i in range(len(old.rules)):
+            old_ids.setdefault(old.rule_id(i, key_func), []).append(i)
+        for i in range(len(self.rules)):
+            same = old_ids.get(self.rule_id(i, key_func))
+            if same:
+                j = same.pop(0)
+                self.seen[i] = old.seen[j]
+                self.armed[i] = old.armed[j]
+                self.last_fired[i] = old.last_fired[j]
+        old_rows = {k: i for i, k in enumerate(old.keys)}
+        for i, k in enumerate(self.keys):
+            if k in old_rows:
+                self.hist[i] = old.hist[old_rows[k]]
+        self.last_minute = old.last_minute
+
+
+class AlertEngine:
+    """
+    每个行情 tick 对全部规则做一次向量化判断
+
+    边沿触发：条件成立的那一刻触发一次，条件消失后才重新 "上膛"，
+    再加上每条规则的冷却时间，避免价格在阈值附近来回抖动时刷屏。
+    """
+    def __init__(self, rules=None, key_func=lambda c: c):
+        self.key_func = key_func
+        self.set_rules(rules or [])
+
+    def set_rules(self, rules):
+        # 可以在 GUI 线程调用：整体替换规则集，evaluate 每次只读取一次引用
+        ruleset = _RuleSet(list(rules), self.key_func)
+        old = getattr(self, "_ruleset", None)
+        if old is not None:
+            ruleset.inherit(old, self.key_func)
+        self._ruleset = ruleset
+
+    def symbols(self):
+        return list(self._ruleset.keys)
+
+    def evaluate(self, table, now=None):
+        """
+        table: QuoteTable (列式行情表)，规则对应的行号按 layout 缓存
+        返回触发的 [(rule, row, price, pct), ...]
+        """
+        rs = self._ruleset
+        if not rs.rules:
+            return []
+        now = time.time() if now is None else now
+        if rs.layout is not table.layout:
+            rs.layout = table.layout
+            rs.rows = table.layout.rows(rs.keys)
+        rows = rs.rows
+        found = (rows >= 0) & table.data["valid"][rows]
+        prices = np.where(found, table.data["price"][rows], np.nan)
+        pcts = np.where(found, table.data["pct"][rows], np.nan)
+        self._record(rs, prices, now)
+
+        p = prices[rs.sym]
+        pct = pcts[rs.sym]
+        slots = HISTORY_MINUTES + 1
+        ref_slot = (int(now // 60) - rs.minutes) % slots
+        ref = rs.hist[rs.sym, ref_slot]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            move = np.abs(p / ref - 1.0) * 100.0
+            cond = np.select(
+                [rs.kind == ABOVE, rs.kind == BELOW, rs.kind == PCT_ABOVE, rs.kind == PCT_BELOW],
+                [p >= rs.value, p <= rs.value, pct >= rs.value, pct <= rs.value],
+                default=move >= rs.value,
+            )
+        valid = ~np.isnan(p)
+        cond &= valid
+        first = valid & ~rs.seen
+        rs.armed[first] = ~cond[first]
+        rs.seen |= first
+
+        fire = cond & rs.armed & (now - rs.last_fired >= rs.cooldown)
+        rs.armed = ~cond | (rs.armed & ~fire)
+        rs.last_fired[fire] = now
+        return [(rs.rules[i], int(rows[rs.sym[i]]), float(p[i]), float(pct[i])) for i in np.flatnonzero(fire)]
+
+    @staticmethod
+    def _record(rs, prices, now):
+        minute = int(now // 60)
+        slots = HISTORY_MINUTES + 1
+        if rs.last_minute is not None and minute - rs.last_minute > 1:
+            # 跳过的分钟 (网络断开等) 置空，避免拿很久以前的价格比较
+            skipped = np.arange(rs.last_minute + 1, minute)[-slots:] % slots
+            rs.hist[:, skipped] = np.nan
+        rs.hist[:, minute % slots] = prices
+        rs.last_minute = minute
@@ -8,6 +8,10 @@ import traceback
 import random
 import numpy as np
 
+from market_sim import synth_daily
+from screener import SpotSnapshot
+from history_store import HistoryStore, bars_to_df
+
 # 强制禁用 SSL 验证
 ssl._create_default_https_context = ssl._create_unverified_context
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -22,47 +26,20 @@ def new_request(self, method, url, *args, **kwargs):
     return old_request(self, method, url, *args, **kwargs)
 requests.Session.request = new_request
 
-# 尝试 Patch akshare 的内部字典 (如果是导入即运行的可能会失效，但在函数调用时可能有效)
-# 这是一个黑魔法，尝试预填充常用股票的市场代码
-# 0: 深市, 1: 沪市, 8: 北交所 (东财的规则)
-known_codes = {
-    '600519': '1', # 茅台
-    '000001': '0', # 平安
-    '000300': '1', # 沪深300 (指数通常有不同接口，这里仅作示例)
-}
-
 class DataFetcher:
     @staticmethod
     def get_realtime_data(symbol: str, use_mock_on_fail: bool = True):
         try:
             print(f"Fetching spot data for {symbol}...")
-            df = ak.stock_zh_a_spot_em()
-            
-            if df is None or df.empty:
-                raise ValueError("Returned empty dataframe")
-            
-            # 确保代码列是字符串
-            df['代码'] = df['代码'].astype(str)
-            
-            target = df[df['代码'] == symbol]
-            
-            if target.empty:
+            # 全市场快照和排行榜共用 (screener.py)，有效期内不重复下载
+            row = SpotSnapshot.lookup(symbol)
+            if row is None:
                 print(f"Symbol {symbol} not found in spot data.")
-                # print("Available codes sample:", df['代码'].head().tolist())
                 raise ValueError("Symbol not found")
             
-            row = target.iloc[0]
-            
-            price = row['最新价']
-            pct_change = row['涨跌幅']
-            name = row['名称']
-            
-            # 类型转换
-            try: price = float(price)
-            except: price = 0.0
-                
-            try: pct_change = float(pct_change)
-            except: pct_change = 0.0
+            name = str(row['name'])
+            price = 0.0 if np.isnan(row['price']) else float(row['price'])
+            pct_change = 0.0 if np.isnan(row['pct']) else float(row['pct'])
 
             return {
                 'symbol': symbol,
@@ -85,12 +62,18 @@ class DataFetcher:
             return None
 
     @staticmethod
-    def get_kline_data(symbol: str, period: str = "daily", adjust: str = "qfq", use_mock_on_fail: bool = True):
+    def get_kline_data(symbol: str, period: str = "daily", adjust: str = "qfq", use_mock_on_fail: bool = True,
+                       pool=None):
         try:
             # 尝试 Patch akshare 内部字典 (如果有办法访问到)
             # 实际上比较难，我们直接捕获异常
             
-            df = ak.stock_zh_a_hist(symbol=symbol, period=period, adjust=adjust)
+            if pool is not None and period == "daily" and adjust in ("", "qfq", "hfq"):
+                # 经本地 K 线库增量更新 (下载在 fetch_pool 子进程里做)，再按因子表本地复权
+                bars = HistoryStore.update(symbol, "daily", pool.fetch_bars)
+                df = bars_to_df(HistoryStore.adjusted(symbol, bars, adjust), "daily")
+            else:
+                df = ak.stock_zh_a_hist(symbol=symbol, period=period, adjust=adjust)
             
             if df is None or df.empty:
                 raise ValueError("Empty kline data")
@@ -114,21 +97,11 @@ class DataFetcher:
             print(f"Kline data fetch failed: {e}")
             if use_mock_on_fail:
                 print("Using MOCK data for K-line.")
-                # 生成模拟K线数据
-                dates = pd.date_range(end=datetime.now(), periods=30)
-                data = {
-                    'Open': np.random.uniform(100, 200, 30),
-                    'High': np.random.uniform(200, 220, 30),
-                    'Low': np.random.uniform(90, 100, 30),
-                    'Close': np.random.uniform(100, 200, 30),
-                    'Volume': np.random.randint(1000, 10000, 30)
-                }
-                # 简单修正 High/Low
-                for i in range(30):
-                    data['High'][i] = max(data['Open'][i], data['Close'][i]) + random.uniform(0, 5)
-                    data['Low'][i] = min(data['Open'][i], data['Close'][i]) - random.uniform(0, 5)
-
-                df = pd.DataFrame(data, index=dates)
+                # 生成模拟K线数据 (与 market_sim.py 同一套向量化随机游走)
+                df = synth_daily(symbol, 30, adjust=adjust)
+                df.index = pd.to_datetime(df['日期'])
+                df = df.rename(columns={'开盘': 'Open', '收盘': 'Close', '最高': 'High', '最低': 'Low', '成交量': 'Volume'})
+                df = df[['Open', 'High', 'Low', 'Close', 'Volume']]
                 return df
             return None
 
@@ -0,0 +1,146 @@
+import os
+import sys
+import queue
+import atexit
+import subprocess
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+
+from history_store import HistoryStore, dtype_of
+
+# -----------------------------------------------------------------------------
+# Fetch Process Pool (K 线下载子进程)
+# -----------------------------------------------------------------------------
+# akshare 下载和 JSON -> DataFrame 的解析都握着 GIL，在 GUI 进程的线程里跑会让界面卡顿。
+# 这里常驻几个子进程专门做这件事，结果按 BAR_DTYPE / FACTOR_DTYPE 的原始字节从管道传回，
+# 不传 pickle 的 DataFrame。子进程用 subprocess 启动 (不走 multiprocessing 的 spawn，
+# 避免子进程重新 import 主程序和 Qt)，启动后监听一个本地端口，把端口号打印到 stdout。
+# 子进程在第一次下载时才启动，不展开图表就不占资源；启动失败时退回到调用线程里下载。
+FETCH_TIMEOUT = 60
+_AUTHKEY_ENV = "FETCH_POOL_AUTHKEY"
+
+
+class _Worker:
+    """
+    一个子进程。挂掉 / 超时后 kill，下次使用时再启动
+    """
+    def __init__(self, authkey):
+        self.authkey = authkey
+        self.proc = None
+        self.conn = None
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        env = dict(os.environ, **{_AUTHKEY_ENV: self.authkey.hex()})
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)], env=env, stdout=subprocess.PIPE,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        line = self.proc.stdout.readline()
+        if not line:
+            self.kill()
+            raise OSError("fetch worker failed to start")
+        self.conn = Client(("127.0.0.1", int(line)), authkey=self.authkey)
+
+    def kill(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc.stdout.close()
+            self.proc = None
+
+    def call(self, request, timeout):
+        self.conn.send(request)
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"fetch worker timed out after {timeout}s")
+        status, message = self.conn.recv()
+        if status == "error":
+            raise RuntimeError(message)
+        return self.conn.recv_bytes()
+
+
+class FetchPool:
+    def __init__(self, workers=2, timeout=FETCH_TIMEOUT):
+        self.timeout = timeout
+        self.authkey = os.urandom(16)
+        self.workers = [_Worker(self.authkey) for _ in range(workers)]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+        self.disabled = False # 子进程起不来时改为在调用线程里下载
+        atexit.register(self.close)
+
+    def fetch_bars(self, code, kind, start="19700101"):
+        """
+        和 HistoryStore.fetch_bars 一样，但在子进程里执行。
+        子进程崩溃时重启并重试一次；超时的子进程直接 kill，下次再启动
+        """
+        if self.disabled:
+            return HistoryStore.fetch_bars(code, kind, start)
+        worker = self.idle.get()
+        try:
+            for attempt in range(2):
+                if not worker.alive():
+                    try:
+                        worker.kill()
+                        worker.start()
+                    except Exception as e:
+                        print(f"Fetch worker failed to start ({e}), fetching in-process")
+                        self.disabled = True
+                        return HistoryStore.fetch_bars(code, kind, start)
+                try:
+                    data = worker.call(("bars", code, kind, start), self.timeout)
+                    return np.frombuffer(data, dtype=dtype_of(kind)).copy()
+                except TimeoutError:
+                    worker.kill()
+                    raise
+                except (EOFError, OSError) as e:
+                    print(f"Fetch worker crashed ({e}), restarting")
+                    worker.kill()
+                    if attempt:
+                        raise
+        finally:
+            self.idle.put(worker)
+
+    def close(self):
+        for worker in self.workers:
+            worker.kill()
+
+
+def _serve():
+    authkey = bytes.fromhex(os.environ[_AUTHKEY_ENV])
+    with Listener(("127.0.0.1", 0), authkey=authkey) as listener:
+        print(listener.address[1], flush=True)
+        # 之后的输出 (akshare 的进度条等) 转到 stderr，父进程不再读 stdout
+        try:
+            os.dup2(2, 1)
+        except OSError:
+            pass # pythonw 启动时没有 stderr
+        sys.stdout = sys.stderr
+        conn = listener.accept()
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return # 父进程退出
+        op, *args = request
+        try:
+            if op != "bars":
+                raise ValueError(f"unknown op {op}")
+            bars = HistoryStore.fetch_bars(*args)
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+            continue
+        conn.send(("ok", len(bars)))
+        conn.send_bytes(np.ascontiguousarray(bars, dtype=dtype_of(args[1])).tobytes())
+
+
+if __name__ == "__main__":
+    _serve()
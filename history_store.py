@@ -0,0 +1,373 @@
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from market_sim import SIM_URL, fetch_history
+from symbol_master import SymbolMaster, KIND_STOCK, _market_of
+
+# -----------------------------------------------------------------------------
+# Local History Store (本地 K 线库)
+# -----------------------------------------------------------------------------
+# history/<code>_<kind>.npy，每个文件一个按时间排序的定长记录数组。
+#   daily:  不复权日线
+#   min1:   不复权 1 分钟线 (只保留最近 MIN1_KEEP_DAYS 个交易日)
+#   factor: 复权因子表，每个除权日一行
+# 本地只存不复权价格，前复权 / 后复权在读出时用因子表现算 (adjust_bars)。
+# 除权除息时只有因子表变化，重新下载这张小表即可，不用重下全部历史。
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 连着模拟器时单独存放，模拟的 K 线不会混进真实的本地库
+HISTORY_DIR = os.path.join(BASE_DIR, "history_sim" if SIM_URL else "history")
+MANIFEST_PATH = os.path.join(HISTORY_DIR, "backfill.json")
+BAR_DTYPE = np.dtype([
+    ("ts", "M8[s]"),
+    ("open", "f8"),
+    ("close", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("volume", "f8"),
+    ("amount", "f8"),
+    ("pre_close", "f8"), # 昨收 (收盘 - 涨跌额)，除权日不等于前一天收盘；分钟线为 nan
+])
+FACTOR_DTYPE = np.dtype([
+    ("ts", "M8[s]"),     # 除权日，到下一个除权日前都用这一行
+    ("qfq", "f8"),       # 前复权价 = 不复权价 / qfq
+    ("hfq", "f8"),       # 后复权价 = 不复权价 * hfq
+])
+PRICE_FIELDS = ("open", "close", "high", "low", "pre_close")
+KINDS = ("daily", "min1")
+MIN1_KEEP_DAYS = 20
+BACKFILL_WORKERS = 4
+BACKFILL_RETRIES = 3
+
+# 与 akshare 返回的列名对应
+_COLUMNS = {"open": "开盘", "close": "收盘", "high": "最高", "low": "最低", "volume": "成交量", "amount": "成交额"}
+_TS_COLUMN = {"daily": "日期", "min1": "时间"}
+
+
+def bars_from_df(df, kind):
+    """
+    akshare 的 DataFrame -> BAR_DTYPE 数组
+    """
+    bars = np.zeros(len(df), dtype=BAR_DTYPE)
+    if not len(df):
+        return bars
+    bars["ts"] = pd.to_datetime(df[_TS_COLUMN[kind]]).to_numpy().astype("M8[s]")
+    for field, col in _COLUMNS.items():
+        if col in df.columns:
+            bars[field] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+    if "涨跌额" in df.columns:
+        bars["pre_close"] = bars["close"] - pd.to_numeric(df["涨跌额"], errors="coerce").to_numpy(dtype=float)
+    else:
+        bars["pre_close"] = np.nan
+    return bars
+
+
+def factors_from_dfs(qfq_df, hfq_df):
+    """
+    stock_zh_a_daily 的 qfq-factor / hfq-factor 两张表 (date, xxx_factor) -> FACTOR_DTYPE 数组
+    两张表的日期不一定完全相同，按并集对齐，各自沿用之前最近的一行
+    """
+    tables = []
+    for df, column in ((qfq_df, "qfq_factor"), (hfq_df, "hfq_factor")):
+        if df is None or df.empty:
+            tables.append((np.zeros(0, dtype="M8[s]"), np.zeros(0)))
+            continue
+        ts = pd.to_datetime(df["date"]).to_numpy().astype("M8[s]")
+        order = np.argsort(ts, kind="stable")
+        tables.append((ts[order], pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)[order]))
+    dates = np.union1d(tables[0][0], tables[1][0])
+    factors = np.zeros(len(dates), dtype=FACTOR_DTYPE)
+    factors["ts"] = dates
+    for field, (ts, values) in zip(("qfq", "hfq"), tables):
+        factors[field] = _step_lookup(ts, values, dates) if len(ts) else 1.0
+    return factors
+
+
+def _step_lookup(ts, values, at):
+    # 每个 at 取 ts <= at 的最后一行，比第一行还早的取第一行
+    idx = np.searchsorted(ts, at, side="right") - 1
+    return values[np.maximum(idx, 0)]
+
+
+def adjust_bars(bars, factors, adjust="qfq"):
+    """
+    不复权 K 线 -> 复权 K 线，价格列整体乘 / 除每天所在除权段的因子。
+    adjust 为 "" 或没有因子表时原样返回
+    """
+    if adjust not in ("qfq", "hfq") or factors is None or not len(factors) or not len(bars):
+        return bars
+    days = bars["ts"].astype("M8[D]")
+    factor = _step_lookup(factors["ts"].astype("M8[D]"), factors[adjust], days)
+    if adjust == "qfq":
+        factor = 1.0 / factor
+    out = bars.copy()
+    for field in PRICE_FIELDS:
+        out[field] *= factor
+    return out
+
+
+def ex_rights_dates(bars):
+    """
+    原始日线里的除权日：当天昨收和前一天收盘不一致 (价格都是两位小数，差半分以上)
+    """
+    if len(bars) < 2:
+        return bars["ts"][:0]
+    gap = np.abs(bars["pre_close"][1:] - bars["close"][:-1])
+    return bars["ts"][1:][gap > 0.005]
+
+
+def bars_to_df(bars, kind):
+    """
+    BAR_DTYPE 数组 -> 与 akshare 列名一致的 DataFrame，图表代码不用区分来源
+    """
+    if kind == "daily":
+        ts = np.datetime_as_string(bars["ts"], unit="D")
+    else:
+        ts = np.char.replace(np.datetime_as_string(bars["ts"], unit="s"), "T", " ")
+    data = {_TS_COLUMN[kind]: ts}
+    for field, col in _COLUMNS.items():
+        data[col] = bars[field]
+    return pd.DataFrame(data)
+
+
+def dtype_of(kind):
+    return FACTOR_DTYPE if kind == "factor" else BAR_DTYPE
+
+
+def merge_bars(old, new):
+    """
+    按时间合并，重叠部分以新数据为准 (最后一根 K 线盘中会变)
+    """
+    if old is None or not len(old):
+        return new
+    if not len(new):
+        return old
+    keep = old[old["ts"] < new["ts"][0]]
+    return np.concatenate([keep, new])
+
+
+class HistoryStore:
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    @staticmethod
+    def path(code, kind):
+        return os.path.join(HISTORY_DIR, f"{code}_{kind}.npy")
+
+    @classmethod
+    def lock(cls, code, kind):
+        # 后台回填和 ChartWorker 可能同时写同一个文件
+        with cls._locks_guard:
+            return cls._locks.setdefault((code, kind), threading.Lock())
+
+    @classmethod
+    def load(cls, code, kind):
+        path = cls.path(code, kind)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+        except Exception as e:
+            print(f"Error loading history {code} {kind}: {e}")
+            return None
+        if data.dtype != dtype_of(kind):
+            return None # 旧版本存的前复权数据，当作没有，重新下载
+        return data
+
+    @classmethod
+    def save(cls, code, kind, bars):
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        path = cls.path(code, kind)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, bars)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def fetch_bars(code, kind, start="19700101"):
+        """
+        联网下载 start 之后的不复权 K 线并转成 BAR_DTYPE，kind 为 factor 时下载
+        复权因子表 (FACTOR_DTYPE，不看 start)。不读写本地文件
+        (可以放到 fetch_pool 的子进程里执行)
+        """
+        if kind == "factor":
+            return factors_from_dfs(*(HistoryStore.fetch_factor_df(code, a) for a in ("qfq-factor", "hfq-factor")))
+        if SIM_URL:
+            # 本地模拟器，返回的列和 akshare 一致
+            df = fetch_history(code, kind, start)
+        elif kind == "daily":
+            import akshare as ak
+            df = ak.stock_zh_a_hist(symbol=code, period="daily", start_date=start, adjust="")
+        else:
+            import akshare as ak
+            df = ak.stock_zh_a_hist_min_em(symbol=code, period="1", adjust="")
+        if df is None or df.empty:
+            return np.zeros(0, dtype=BAR_DTYPE)
+        return bars_from_df(df, kind)
+
+    @staticmethod
+    def fetch_factor_df(code, adjust):
+        if SIM_URL:
+            return fetch_history(code, adjust)
+        import akshare as ak
+        # 新浪接口要带市场前缀
+        sec_id = SymbolMaster.resolve(code) or _market_of(code, KIND_STOCK) + code
+        return ak.stock_zh_a_daily(symbol=sec_id, adjust=adjust)
+
+    @classmethod
+    def adjusted(cls, code, bars, adjust="qfq"):
+        """
+        本地不复权 K 线 + 本地因子表 -> 复权 K 线，不联网
+        """
+        return adjust_bars(bars, cls.load(code, "factor"), adjust)
+
+    @classmethod
+    def update(cls, code, kind, fetch=None):
+        """
+        联网增量更新 (不复权)：日线只请求本地最后一天之后的数据，并按需更新因子表，
+        1 分钟线接口本身只返回最近几天，合并后裁掉太旧的
+        fetch: 替代 fetch_bars 的下载函数 (如 FetchPool.fetch_bars)
+        """
+        fetch = fetch or cls.fetch_bars
+        with cls.lock(code, kind):
+            old = cls.load(code, kind)
+            start = "19700101"
+            if kind == "daily" and old is not None and len(old):
+                start = old["ts"][-1].astype("M8[D]").item().strftime("%Y%m%d")
+            new = fetch(code, kind, start)
+            if not len(new):
+                if old is None:
+                    raise ValueError("Empty history data")
+                bars = old
+            else:
+                bars = merge_bars(old, new)
+                if kind == "min1":
+                    days = np.unique(bars["ts"].astype("M8[D]"))
+                    if len(days) > MIN1_KEEP_DAYS:
+                        bars = bars[bars["ts"] >= days[-MIN1_KEEP_DAYS]]
+                cls.save(code, kind, bars)
+
+        if kind == "daily":
+            try:
+                cls.update_factors(code, bars, fetch)
+            except Exception as e:
+                # 没有新因子时图表先按旧因子复权，下次更新再试
+                print(f"Error updating factors for {code}: {e}")
+        return bars
+
+    @classmethod
+    def update_factors(cls, code, bars, fetch=None):
+        """
+        本地没有因子表，或者日线里出现了因子表最后一行之后的除权日时，重新下载因子表。
+        数据源在除权日当天可能还没更新因子，或者下载失败，这两种情况每天最多重试一次
+        """
+        fetch = fetch or cls.fetch_bars
+        with cls.lock(code, "factor"):
+            factors = cls.load(code, "factor")
+            if factors is not None:
+                ex = ex_rights_dates(bars)
+                if not len(ex) or (len(factors) and ex[-1] <= factors["ts"][-1]):
+                    return factors
+                fetched = datetime.date.fromtimestamp(os.path.getmtime(cls.path(code, "factor")))
+                if fetched == datetime.date.today():
+                    return factors
+            try:
+                new = fetch(code, "factor")
+            except Exception:
+                # ETF、指数、新股等没有因子表的代码会一直下载失败：记下这次尝试
+                # (没有文件时存一张空表)，同样每天最多重试一次
+                if factors is None:
+                    cls.save(code, "factor", np.zeros(0, dtype=FACTOR_DTYPE))
+                else:
+                    os.utime(cls.path(code, "factor"))
+                raise
+            cls.save(code, "factor", new)
+            return new
+
+
+# -----------------------------------------------------------------------------
+# Backfill (批量回填)
+# -----------------------------------------------------------------------------
+def _load_manifest():
+    if os.path.exists(MANIFEST_PATH):
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            pass
+    return {}
+
+
+def _save_manifest(manifest):
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def backfill(codes, kinds=KINDS, workers=BACKFILL_WORKERS, retries=BACKFILL_RETRIES,
+             progress=None, should_stop=None, fetch=None):
+    """
+    并发回填 codes 的日线和 1 分钟线，写入本地库
+    backfill.json 记录每个 (代码, 周期) 最后成功的日期，中断后重跑会跳过今天已完成的
+    progress(done, total, code, kind, ok) 在工作线程里回调
+    fetch 同 HistoryStore.update
+    返回失败的 [(code, kind), ...]
+    """
+    today = datetime.date.today().isoformat()
+    manifest = _load_manifest()
+    tasks = [(c, k) for c in dict.fromkeys(codes) for k in kinds if manifest.get(f"{c}|{k}") != today]
+    total = len(tasks)
+    failed = []
+    if progress:
+        progress(0, total, None, None, True)
+
+    def run(code, kind):
+        for attempt in range(retries):
+            if should_stop and should_stop():
+                return False
+            try:
+                HistoryStore.update(code, kind, fetch)
+                return True
+            except Exception as e:
+                print(f"Backfill {code} {kind} failed ({attempt + 1}/{retries}): {e}")
+                if attempt + 1 < retries:
+                    time.sleep(2 ** attempt)
+        return False
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+        futures = {pool.submit(run, code, kind): (code, kind) for code, kind in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            code, kind = futures[future]
+            ok = future.result()
+            if ok:
+                manifest[f"{code}|{kind}"] = today
+                _save_manifest(manifest)
+            else:
+                failed.append((code, kind))
+            if progress:
+                progress(done, total, code, kind, ok)
+    return failed
+
+
+if __name__ == "__main__":
+    # python history_store.py [code ...]    不带参数时回填 stock_config.json 里的全部代码
+    codes = sys.argv[1:]
+    if not codes:
+        with open(os.path.join(BASE_DIR, "stock_config.json"), "r", encoding="utf-8") as f:
+            codes = json.load(f).get("stocks", [])
+
+    def show(done, total, code, kind, ok):
+        if code:
+            print(f"[{done}/{total}] {code} {kind} {'ok' if ok else 'FAILED'}")
+
+    failed = backfill(codes, progress=show)
+    print(f"Done, {len(failed)} failed")
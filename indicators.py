@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Technical Indicators (均线 / MACD)
+# -----------------------------------------------------------------------------
+MA_PERIODS = (5, 10, 20, 60)
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+MA_COLORS = {5: "#FFFFFF", 10: "#FFD54F", 20: "#E040FB", 60: "#40C4FF"}
+INDICATOR_COLUMNS = tuple(f"ma{n}" for n in MA_PERIODS) + ("dif", "dea", "macd") # 附在图表 df 上的列
+
+
+def sma(close, n):
+    """
+    简单移动平均，前 n-1 个为 NaN
+    """
+    out = np.full(len(close), np.nan)
+    if len(close) >= n:
+        csum = np.cumsum(np.insert(close, 0, 0.0))
+        out[n - 1:] = (csum[n:] - csum[:-n]) / n
+    return out
+
+
+def ema(x, n):
+    # 与同花顺/通达信一致：首值为第一根 K 线，adjust=False
+    return pd.Series(x).ewm(span=n, adjust=False).mean().to_numpy()
+
+
+def _full(close):
+    res = {f"ma{n}": sma(close, n) for n in MA_PERIODS}
+    ema_fast = ema(close, MACD_FAST)
+    ema_slow = ema(close, MACD_SLOW)
+    dif = ema_fast - ema_slow
+    dea = ema(dif, MACD_SIGNAL)
+    res.update(ema_fast=ema_fast, ema_slow=ema_slow, dif=dif, dea=dea, macd=2 * (dif - dea))
+    return res
+
+
+class IndicatorState:
+    """
+    单个 (代码, 周期) 的指标缓存
+
+    最后一根 K 线视为"未完成" (分时/盘中日线会不断变化)，
+    除它以外的 K 线都已定型。新数据到来时只从最后一根已定型 K 线
+    往后递推，每根 K 线 O(1)，不重算整段历史。
+    输入是本地的全部历史 (不是显示窗口)，结果与冷启动全量计算一致。
+    """
+
+    def __init__(self):
+        self.ts = None     # 时间戳 (与各指标数组对齐)
+        self.close = None
+        self.values = None
+
+    def update(self, ts, close):
+        ts = np.asarray(ts)
+        close = np.asarray(close, dtype=float)
+        start = self._align(ts, close)
+        if start is None:
+            self._recompute(ts, close)
+        else:
+            self._extend(ts, close, start)
+        n = len(ts)
+        return {k: v[-n:] for k, v in self.values.items()}
+
+    def _align(self, ts, close):
+        """
+        找到缓存里最后一根已定型 K 线在新数据中的位置，
+        新数据与缓存对不上 (换日、窗口变长、复权导致历史价格变化) 时返回 None
+        """
+        if self.ts is None or len(self.ts) < 2 or len(ts) == 0:
+            return None
+        last_done = len(self.ts) - 2
+        # 新 K 线通常只有一两根，从尾部往前找
+        for k in range(len(ts) - 1, max(-1, len(ts) - 16), -1):
+            if ts[k] == self.ts[last_done]:
+                break
+        else:
+            return None
+        first = last_done - k
+        if first < 0 or ts[0] != self.ts[first]:
+            return None
+        if close[0] != self.close[first] or close[k] != self.close[last_done]:
+            return None
+        return k
+
+    def _recompute(self, ts, close):
+        self.ts = ts.copy()
+        self.close = close.copy()
+        self.values = _full(close)
+
+    def _extend(self, ts, close, k):
+        # 丢掉缓存里未完成的最后一根，接上 k 之后的新 K 线
+        keep = len(self.ts) - 1
+        new_ts = ts[k + 1:]
+        new_close = close[k + 1:]
+        m = len(new_close)
+
+        hist_close = np.concatenate([self.close[:keep], new_close])
+        values = {key: np.concatenate([v[:keep], np.empty(m)]) for key, v in self.values.items()}
+
+        a_fast = 2.0 / (MACD_FAST + 1)
+        a_slow = 2.0 / (MACD_SLOW + 1)
+        a_sig = 2.0 / (MACD_SIGNAL + 1)
+        ef = values["ema_fast"]
+        es = values["ema_slow"]
+        dif = values["dif"]
+        dea = values["dea"]
+        for i in range(keep, keep + m):
+            c = hist_close[i]
+            for n in MA_PERIODS:
+                values[f"ma{n}"][i] = hist_close[i - n + 1:i + 1].mean() if i >= n - 1 else np.nan
+            if i == 0:
+                ef[i] = es[i] = c
+                dea[i] = 0.0
+            else:
+                ef[i] = ef[i - 1] + a_fast * (c - ef[i - 1])
+                es[i] = es[i - 1] + a_slow * (c - es[i - 1])
+            dif[i] = ef[i] - es[i]
+            if i > 0:
+                dea[i] = dea[i - 1] + a_sig * (dif[i] - dea[i - 1])
+            values["macd"][i] = 2 * (dif[i] - dea[i])
+
+        self.ts = np.concatenate([self.ts[:keep], new_ts])
+        self.close = hist_close
+        self.values = values
+
+
+class IndicatorCache:
+    _states = {}  # (code, period) -> IndicatorState
+
+    @classmethod
+    def update(cls, code, period, ts, close):
+        """
+        返回与输入等长的指标数组 {ma5, ma10, ma20, ma60, dif, dea, macd, ...}
+        """
+        key = (code, period)
+        state = cls._states.get(key)
+        if state is None:
+            state = cls._states[key] = IndicatorState()
+        return state.update(ts, close)
+
+    @classmethod
+    def drop(cls, code):
+        for key in [k for k in cls._states if k[0] == code]:
+            del cls._states[key]
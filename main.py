@@ -13,10 +13,12 @@ import mplfinance as mpf
 import pandas as pd
 
 from data_fetcher import DataFetcher
+from fetch_pool import FetchPool
 
 # 配置常量
 DEFAULT_SYMBOL = "600519" # 茅台
 REFRESH_INTERVAL = 3000 # 3秒刷新一次
+USE_FETCH_POOL = True # K线在子进程里下载解析 (fetch_pool.py)，避免界面卡顿
 
 class DataWorker(QThread):
     data_signal = pyqtSignal(dict)
@@ -40,12 +42,13 @@ class DataWorker(QThread):
 class KlineWorker(QThread):
     kline_signal = pyqtSignal(pd.DataFrame)
     
-    def __init__(self, symbol):
+    def __init__(self, symbol, pool=None):
         super().__init__()
         self.symbol = symbol
+        self.pool = pool
 
     def run(self):
-        df = DataFetcher.get_kline_data(self.symbol)
+        df = DataFetcher.get_kline_data(self.symbol, pool=self.pool)
         if df is not None:
             self.kline_signal.emit(df)
 
@@ -160,6 +163,7 @@ class StockWidget(QMainWindow):
         self.data_worker.start()
         
         self.kline_worker = None
+        self.fetch_pool = FetchPool(1) if USE_FETCH_POOL else None
         
         # Move logic
         self.old_pos = None
@@ -202,7 +206,7 @@ class StockWidget(QMainWindow):
         if self.kline_worker and self.kline_worker.isRunning():
             return
         
-        self.kline_worker = KlineWorker(self.symbol)
+        self.kline_worker = KlineWorker(self.symbol, self.fetch_pool)
         self.kline_worker.kline_signal.connect(self.chart_widget.plot)
         self.kline_worker.start()
 
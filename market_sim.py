@@ -0,0 +1,536 @@
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import datetime
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Market Simulator (本地模拟行情)
+# -----------------------------------------------------------------------------
+# 不联网压测用：生成成千上万条相关的随机游走价格，按腾讯 / 新浪 / 东财的原始格式返回，
+# 另有 /hist、/min、/spot、/factor 四个接口，返回的列和 akshare 的 stock_zh_a_hist /
+# stock_zh_a_hist_min_em / stock_zh_a_spot_em / stock_zh_a_daily(adjust="qfq-factor") 一致。
+#
+#   python market_sim.py --symbols 5000 --latency 30 --error-rate 0.01
+#   set STOCK_SIM_URL=http://127.0.0.1:8765 后再启动 stock_monitor.py
+SIM_URL = os.environ.get("STOCK_SIM_URL", "").rstrip("/")
+DEFAULT_PORT = 8765
+HIST_DAYS = 1000
+MIN_DAYS = 5
+TICK_SECONDS = 1.0
+MAX_STEPS = 600        # 很久没有请求时，一次最多补这么多步
+
+# 交易时段内每根 1 分钟线的结束时间 (09:30 集合竞价 + 240 根)
+_SESSION = pd.to_timedelta(
+    [9 * 60 + 30] + list(range(9 * 60 + 31, 11 * 60 + 31)) + list(range(13 * 60 + 1, 15 * 60 + 1)), unit="m")
+
+_MARKET_FLAG = {"sh": "1", "sz": "51", "bj": "62"}
+_INDEX_CODES = ("sh000001", "sz399001", "sz399006")
+
+
+def _seed(code):
+    return zlib.crc32(code.encode())
+
+
+def _default_codes(n):
+    # 一半沪市一半深市，加上界面用到的三个指数
+    codes = list(_INDEX_CODES)
+    half = n // 2
+    codes += [f"sh{600000 + i}" for i in range(half)]
+    codes += [f"sz{i + 1:06d}" for i in range(n - half)]
+    return codes
+
+
+class MarketSim:
+    """
+    单因子模型：每一步收益 = sigma * (sqrt(rho) * 市场 + sqrt(1 - rho) * 个股)，
+    全部代码一次用 NumPy 向量化推进。按墙钟时间推进，请求到来时补齐落下的步数。
+    """
+    def __init__(self, codes, daily_vol=0.02, corr=0.4, tick=TICK_SECONDS, seed=None):
+        self.daily_vol = daily_vol
+        self.corr = corr
+        self.tick = tick
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.codes = []
+        self.index = {}
+        self.names = []
+        self.pre_close = np.zeros(0)
+        self.open = np.zeros(0)
+        self.price = np.zeros(0)
+        self.high = np.zeros(0)
+        self.low = np.zeros(0)
+        self.volume = np.zeros(0)     # 手
+        self.amount = np.zeros(0)     # 万元
+        self.sigma = np.zeros(0)
+        self.liquidity = np.zeros(0)  # 每步平均成交量 (手)
+        self.shares = np.zeros(0)     # 总股本 (股)
+        self.last_step = time.monotonic()
+        self.steps = 0
+        self.add(codes)
+
+    def add(self, codes):
+        """
+        加入新代码；初始价格、波动率按代码确定，和 history() 生成的历史 K 线衔接
+        """
+        with self.lock:
+            new = [c for c in dict.fromkeys(codes) if c not in self.index]
+            if not new:
+                return
+            params = np.array([self._params(c) for c in new])
+            pre_close, sigma, liquidity, shares = params.T
+            ticks_per_day = 4 * 3600 / self.tick
+            for c in new:
+                self.index[c] = len(self.codes)
+                self.codes.append(c)
+                self.names.append(f"模拟{c[-4:]}")
+            self.pre_close = np.r_[self.pre_close, pre_close]
+            self.open = np.r_[self.open, pre_close]
+            self.price = np.r_[self.price, pre_close]
+            self.high = np.r_[self.high, pre_close]
+            self.low = np.r_[self.low, pre_close]
+            self.volume = np.r_[self.volume, np.zeros(len(new))]
+            self.amount = np.r_[self.amount, np.zeros(len(new))]
+            self.sigma = np.r_[self.sigma, sigma / np.sqrt(ticks_per_day)]
+            self.liquidity = np.r_[self.liquidity, liquidity / ticks_per_day]
+            self.shares = np.r_[self.shares, shares]
+
+    def _params(self, code):
+        rng = np.random.default_rng(_seed(code))
+        pre_close = round(float(np.exp(rng.normal(np.log(20), 0.8))), 2)
+        sigma = self.daily_vol * rng.uniform(0.5, 1.5)
+        liquidity = float(np.exp(rng.normal(np.log(2e5), 1.0))) # 日成交量 (手)
+        shares = float(np.exp(rng.normal(np.log(2e9), 1.0)))
+        return pre_close, sigma, liquidity, shares
+
+    def step(self):
+        """
+        补齐从上次到现在落下的步数，(步数, 代码数) 的收益矩阵一次生成
+        """
+        with self.lock:
+            now = time.monotonic()
+            k = min(int((now - self.last_step) / self.tick), MAX_STEPS)
+            if k <= 0 or not self.codes:
+                return
+            self.last_step = now if k == MAX_STEPS else self.last_step + k * self.tick
+            self.steps += k
+            n = len(self.codes)
+            market = self.rng.standard_normal((k, 1))
+            idio = self.rng.standard_normal((k, n))
+            ret = self.sigma * (np.sqrt(self.corr) * market + np.sqrt(1 - self.corr) * idio)
+            path = self.price * np.exp(np.cumsum(ret, axis=0))
+            # 涨跌停 ±10%
+            path = np.clip(path, self.pre_close * 0.9, self.pre_close * 1.1)
+            self.price = path[-1]
+            self.high = np.maximum(self.high, path.max(axis=0))
+            self.low = np.minimum(self.low, path.min(axis=0))
+            vol = self.liquidity * k * self.rng.lognormal(0, 0.5, n)
+            self.volume += vol
+            self.amount += vol * 100 * path.mean(axis=0) / 10000
+
+    def snapshot(self, codes):
+        """
+        返回 (各列的拷贝, 名称列表)，格式化在锁外做
+        """
+        self.add(codes)
+        self.step()
+        with self.lock:
+            rows = np.array([self.index[c] for c in codes], dtype=np.intp)
+            cols = {name: getattr(self, name)[rows].copy() for name in
+                    ("pre_close", "open", "price", "high", "low", "volume", "amount", "sigma", "liquidity", "shares")}
+            names = [self.names[i] for i in rows]
+        return cols, names
+
+    # -------------------------------------------------------------------------
+    # 行情格式
+    # -------------------------------------------------------------------------
+    def tencent(self, request_codes):
+        """
+        v_sh600519="1~name~code~price~pre_close~open~vol~...";  完整格式 (字段位置同腾讯)
+        v_s_sh600519="1~name~code~price~change~pct~vol~amount~~mktcap~GP-A";  精简格式
+        """
+        codes = [c[2:] if c.startswith("s_") else c for c in request_codes]
+        cols, names = self.snapshot(codes)
+        book = self._book(cols)
+        now = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        out = []
+        for i, (req, code) in enumerate(zip(request_codes, codes)):
+            price = round(cols["price"][i], 2)
+            pre_close = cols["pre_close"][i]
+            change = price - pre_close
+            pct = change / pre_close * 100
+            vol = int(cols["volume"][i])
+            amount = cols["amount"][i]
+            mktcap = price * cols["shares"][i] / 1e8
+            flag = _MARKET_FLAG.get(code[:2], "1")
+            if req.startswith("s_"):
+                out.append(f'v_{req}="{flag}~{names[i]}~{code[2:]}~{price:.2f}~{change:.2f}~{pct:.2f}~'
+                           f'{vol}~{amount:.0f}~~{mktcap:.2f}~GP-A";')
+                continue
+            levels = "~".join(f"{p:.2f}~{int(v)}" for p, v in book[i])
+            fields = [
+                flag, names[i], code[2:], f"{price:.2f}", f"{pre_close:.2f}", f"{cols['open'][i]:.2f}",
+                str(vol), str(vol // 2), str(vol - vol // 2), levels, "", now,
+                f"{change:.2f}", f"{pct:.2f}", f"{cols['high'][i]:.2f}", f"{cols['low'][i]:.2f}",
+                f"{price:.2f}/{vol}/{amount * 10000:.0f}", str(vol), f"{amount:.0f}",
+                f"{vol * 100 / cols['shares'][i] * 100:.2f}", "", "",
+                f"{cols['high'][i]:.2f}", f"{cols['low'][i]:.2f}",
+                f"{(cols['high'][i] - cols['low'][i]) / pre_close * 100:.2f}",
+                f"{mktcap:.2f}", f"{mktcap:.2f}", "", f"{pre_close * 1.1:.2f}", f"{pre_close * 0.9:.2f}",
+            ]
+            out.append(f'v_{code}="{"~".join(fields)}";')
+        return "\n".join(out)
+
+    def sina(self, codes):
+        """
+        var hq_str_sh600519="name,open,pre_close,price,high,low,bid1,ask1,成交量(股),成交额(元),
+                             买一量,买一价,...,卖五量,卖五价,date,time,00";
+        """
+        cols, names = self.snapshot(codes)
+        book = self._book(cols)
+        day, clock = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S").split()
+        out = []
+        for i, code in enumerate(codes):
+            levels = ",".join(f"{int(v * 100)},{p:.2f}" for p, v in book[i])
+            out.append(
+                f'var hq_str_{code}="{names[i]},{cols["open"][i]:.2f},{cols["pre_close"][i]:.2f},'
+                f'{cols["price"][i]:.2f},{cols["high"][i]:.2f},{cols["low"][i]:.2f},'
+                f'{book[i][0][0]:.2f},{book[i][5][0]:.2f},{int(cols["volume"][i] * 100)},'
+                f'{cols["amount"][i] * 10000:.0f},{levels},{day},{clock},00";')
+        return "\n".join(out)
+
+    def eastmoney(self, secids):
+        # secid: "1.600519" / "0.000001"；东财的 secid 不区分深市和北交所
+        market = {"1": "sh", "0": "sz"}
+        codes = [market.get(s.split(".")[0], "sz") + s.split(".")[-1] for s in secids]
+        cols, names = self.snapshot(codes)
+        diff = []
+        for i, (secid, code) in enumerate(zip(secids, codes)):
+            price = round(float(cols["price"][i]), 2)
+            change = price - cols["pre_close"][i]
+            diff.append({
+                "f2": price,
+                "f3": round(float(change / cols["pre_close"][i] * 100), 2),
+                "f4": round(float(change), 2),
+                "f6": round(float(cols["amount"][i] * 10000), 0),
+                "f12": code[2:],
+                "f13": int(secid.split(".")[0]),
+                "f14": names[i],
+            })
+        return json.dumps({"rc": 0, "data": {"total": len(diff), "diff": diff}}, ensure_ascii=False)
+
+    def spot(self):
+        """
+        全部个股 (不含指数)，列同 ak.stock_zh_a_spot_em 的主要列
+        """
+        codes = [c for c in self.codes if c not in _INDEX_CODES]
+        cols, names = self.snapshot(codes)
+        price = cols["price"].round(2)
+        change = price - cols["pre_close"]
+        expected = cols["liquidity"] * max(self.steps, 1)
+        df = pd.DataFrame({
+            "代码": [c[2:] for c in codes],
+            "名称": names,
+            "最新价": price,
+            "涨跌幅": (change / cols["pre_close"] * 100).round(2),
+            "涨跌额": change.round(2),
+            "成交量": cols["volume"].round(),
+            "成交额": (cols["amount"] * 10000).round(),
+            "最高": cols["high"].round(2),
+            "最低": cols["low"].round(2),
+            "今开": cols["open"].round(2),
+            "昨收": cols["pre_close"].round(2),
+            "量比": (cols["volume"] / expected).round(2),
+            "换手率": (cols["volume"] * 100 / cols["shares"] * 100).round(2),
+        })
+        return df.to_json(orient="records", force_ascii=False)
+
+    def _book(self, cols):
+        """
+        五档盘口，(代码数, 10, 2)：买一~买五, 卖一~卖五 的 (价, 量)
+        """
+        n = len(cols["price"])
+        rng = np.random.default_rng() # 多个请求线程同时调用，不共用 self.rng
+        steps = np.arange(1, 6) * 0.01
+        bid = np.round(cols["price"][:, None] - steps + 0.01, 2)
+        ask = np.round(cols["price"][:, None] + steps, 2)
+        vols = np.maximum(1, rng.lognormal(np.log(cols["liquidity"][:, None] * 5 + 1), 0.7, (n, 10))).astype(int)
+        prices = np.concatenate([bid, ask], axis=1)
+        return np.stack([prices, vols], axis=2).tolist()
+
+    # -------------------------------------------------------------------------
+    # 历史 K 线
+    # -------------------------------------------------------------------------
+    def history(self, code, adjust=""):
+        """
+        (日线, 1 分钟线)，列名和 akshare 一致，1 分钟线总是不复权。
+        历史部分按代码确定，最后一根接上当前模拟行情
+        """
+        code = self._full_code(code)
+        cols, _ = self.snapshot([code])
+        live = {k: float(v[0]) for k, v in cols.items()}
+        raw = synth_daily(code, HIST_DAYS, live)
+        daily = raw if not adjust else synth_daily(code, HIST_DAYS, live, adjust)
+        return daily, synth_minute(code, raw.tail(MIN_DAYS))
+
+    def factors(self, code):
+        return synth_factors(self._full_code(code))
+
+    @staticmethod
+    def _full_code(code):
+        if not code[:2].isalpha():
+            code = ("sh" if code.startswith(("5", "6", "9")) else "sz") + code
+        return code
+
+
+def synth_factors(code):
+    """
+    按代码确定的除权除息，大约每年一次，每次 0.5%~3%。
+    返回每段的 (date, qfq_factor, hfq_factor)，第一段从历史第一天开始：
+      前复权价 = 不复权价 / qfq_factor (最新一段为 1)
+      后复权价 = 不复权价 * hfq_factor (最早一段为 1)
+    """
+    rng = np.random.default_rng(_seed(code) ^ 0xD1F)
+    dates = pd.bdate_range(end=datetime.date.today(), periods=HIST_DAYS)
+    ex = np.sort(rng.choice(np.arange(1, HIST_DAYS), HIST_DAYS // 250, replace=False))
+    # 每次除权后价格乘以 ratio，cum[i] 为第 i 段相对第一段的累计比例
+    cum = np.cumprod(np.r_[1.0, 1 - rng.uniform(0.005, 0.03, len(ex))])
+    return pd.DataFrame({
+        "date": dates[np.r_[0, ex]].strftime("%Y-%m-%d"),
+        "qfq_factor": cum / cum[-1],
+        "hfq_factor": cum[0] / cum,
+    })
+
+
+def synth_daily(code, days, live=None, adjust=""):
+    """
+    按代码确定的日线随机游走 (向量化)，live 给出时最后一根是当天的实时数据，
+    前一根的前复权收盘价等于 live["pre_close"]。
+    adjust: "" 不复权 (除权日有跳空，涨跌额按除权后的昨收计算) / "qfq" / "hfq"
+    """
+    rng = np.random.default_rng(_seed(code))
+    dates = pd.bdate_range(end=datetime.date.today(), periods=days)
+    sigma = rng.uniform(0.01, 0.03)
+    ret = rng.normal(0.0003, sigma, days)
+    close = np.exp(np.cumsum(ret))
+    anchor = live["pre_close"] if live else float(np.exp(rng.normal(np.log(20), 0.8)))
+    close *= anchor / close[-2]
+    prev = np.r_[close[0] / np.exp(ret[0]), close[:-1]]
+    open_ = prev * np.exp(rng.normal(0, sigma * 0.3, days))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, sigma * 0.5, days)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, sigma * 0.5, days)))
+    volume = np.exp(rng.normal(np.log(2e5), 0.5, days)).round()
+    if live:
+        open_[-1], close[-1], high[-1], low[-1], volume[-1] = (
+            live["open"], live["price"], live["high"], live["low"], live["volume"])
+    # 上面是前复权价格，按每天所在的除权段换算成 adjust 要的价格
+    factors = synth_factors(code)
+    seg = np.searchsorted(pd.to_datetime(factors["date"]).to_numpy(), dates.to_numpy(), side="right") - 1
+    qfq = factors["qfq_factor"].to_numpy()[np.maximum(seg, 0)]
+    if adjust == "qfq":
+        scale = np.ones(days)
+    elif adjust == "hfq":
+        scale = qfq * factors["hfq_factor"].to_numpy()[np.maximum(seg, 0)]
+    else:
+        scale = qfq
+    open_, close, high, low = [(x * scale).round(2) for x in (open_, close, high, low)]
+    pre_close = (prev * scale).round(2)
+    amount = volume * 100 * (open_ + close) / 2
+    change = (close - pre_close).round(2)
+    return pd.DataFrame({
+        "日期": dates.strftime("%Y-%m-%d"),
+        "股票代码": code[-6:],
+        "开盘": open_,
+        "收盘": close,
+        "最高": high,
+        "最低": low,
+        "成交量": volume,
+        "成交额": amount.round(0),
+        "振幅": ((high - low) / pre_close * 100).round(2),
+        "涨跌幅": (change / pre_close * 100).round(2),
+        "涨跌额": change,
+        "换手率": (volume / 2e7).round(2),
+    })
+
+
+def synth_minute(code, daily):
+    """
+    daily 里每个交易日的 1 分钟线：从开盘走到收盘的布朗桥，(天数, 241) 一次生成。
+    当天只生成到当前时刻，并以当前价 (daily 最后一根的收盘) 结束
+    """
+    rng = np.random.default_rng(_seed(code) ^ 0x5EED)
+    days, n = len(daily), len(_SESSION)
+    opens = daily["开盘"].to_numpy(float)[:, None]
+    closes = daily["收盘"].to_numpy(float)[:, None]
+    ts = pd.to_datetime(daily["日期"]).to_numpy()[:, None] + _SESSION.to_numpy()[None, :]
+    counts = (ts <= np.datetime64(datetime.datetime.now())).sum(axis=1)
+    ends = np.maximum(counts - 1, 1)[:, None]
+
+    frac = np.minimum(np.arange(n)[None, :] / ends, 1.0)
+    walk = np.cumsum(rng.normal(0, 0.0015, (days, n)), axis=1)
+    walk -= frac * np.take_along_axis(walk, ends, axis=1)  # 两端固定
+    path = opens * np.exp(walk) * (closes / opens) ** frac
+    prev = np.concatenate([opens, path[:, :-1]], axis=1)
+    wiggle = np.abs(rng.normal(0, 0.0008, (days, n)))
+    high = np.maximum(prev, path) * (1 + wiggle)
+    low = np.minimum(prev, path) * (1 - wiggle)
+    volume = np.exp(rng.normal(np.log(800), 0.8, (days, n))).round()
+
+    keep = (np.arange(n)[None, :] < counts[:, None]).ravel()
+    return pd.DataFrame({
+        "时间": pd.DatetimeIndex(ts.ravel()[keep]).strftime("%Y-%m-%d %H:%M:%S"),
+        "开盘": prev.ravel()[keep].round(2),
+        "收盘": path.ravel()[keep].round(2),
+        "最高": high.ravel()[keep].round(2),
+        "最低": low.ravel()[keep].round(2),
+        "成交量": volume.ravel()[keep],
+        "成交额": (volume * 100 * path).ravel()[keep].round(0),
+        "均价": path.ravel()[keep].round(3),
+    })
+
+
+# -----------------------------------------------------------------------------
+# Client (STOCK_SIM_URL 设置时，history_store 用它代替 akshare)
+# -----------------------------------------------------------------------------
+def fetch_history(code, kind, start_date=None, timeout=10):
+    """
+    kind: daily (不复权日线) / min1 / qfq-factor / hfq-factor
+    """
+    import requests
+
+    if kind == "daily":
+        resp = requests.get(f"{SIM_URL}/hist", params={"symbol": code, "start_date": start_date or "19700101"},
+                            timeout=timeout)
+    elif kind.endswith("-factor"):
+        resp = requests.get(f"{SIM_URL}/factor", params={"symbol": code, "adjust": kind}, timeout=timeout)
+    else:
+        resp = requests.get(f"{SIM_URL}/min", params={"symbol": code}, timeout=timeout)
+    resp.raise_for_status()
+    return pd.DataFrame(resp.json())
+
+
+# -----------------------------------------------------------------------------
+# Server
+# -----------------------------------------------------------------------------
+class FaultConfig:
+    """
+    延迟和错误注入
+    latency / jitter: 毫秒；error_rate: 返回 HTTP 500 的比例；hang_rate: 卡住 hang 秒再返回的比例
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, hang_rate=0.0, hang=10.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang = hang
+
+
+class SimHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        sim, faults = self.server.sim, self.server.faults
+        delay = max(0.0, random.gauss(faults.latency, faults.jitter)) / 1000
+        if random.random() < faults.hang_rate:
+            delay += faults.hang
+        if delay:
+            time.sleep(delay)
+        if random.random() < faults.error_rate:
+            self.reply(500, b"injected error", "text/plain")
+            return
+
+        try:
+            status, body, content_type = self.route(sim)
+        except Exception as e:
+            status, body, content_type = 500, str(e).encode(), "text/plain"
+        self.reply(status, body, content_type)
+
+    def route(self, sim):
+        """
+        生成响应，返回 (状态码, body, Content-Type)；写 socket 在 reply 里
+        """
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path.startswith("/q="):
+            body = sim.tencent([c for c in url.path[3:].split(",") if c]).encode("gbk", errors="replace")
+            return 200, body, "text/html; charset=GBK"
+        if url.path.startswith("/list="):
+            body = sim.sina([c for c in url.path[6:].split(",") if c]).encode("gbk", errors="replace")
+            return 200, body, "application/javascript; charset=GBK"
+        if url.path == "/api/qt/ulist.np/get":
+            secids = [s for s in query.get("secids", [""])[0].split(",") if s]
+            return 200, sim.eastmoney(secids).encode(), "application/json"
+        if url.path == "/spot":
+            return 200, sim.spot().encode(), "application/json"
+        if url.path in ("/hist", "/min"):
+            code = query.get("symbol", [""])[0]
+            daily, minute = sim.history(code, query.get("adjust", [""])[0])
+            df = daily if url.path == "/hist" else minute
+            if url.path == "/hist":
+                start = pd.to_datetime(query.get("start_date", ["19700101"])[0]).strftime("%Y-%m-%d")
+                df = df[df["日期"] >= start]
+            return 200, df.to_json(orient="records", force_ascii=False).encode(), "application/json"
+        if url.path == "/factor":
+            # 和 stock_zh_a_daily(adjust="qfq-factor" / "hfq-factor") 一样，两列 date, xxx_factor
+            column = query.get("adjust", ["qfq-factor"])[0].replace("-", "_")
+            df = sim.factors(query.get("symbol", [""])[0])[["date", column]]
+            return 200, df.to_json(orient="records").encode(), "application/json"
+        return 404, b"not found", "text/plain"
+
+    def reply(self, status, body, content_type):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端等不及 (注入的延迟 / 卡住) 已经断开，不用管
+            self.close_connection = True
+
+
+def serve(sim, faults=None, host="127.0.0.1", port=DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), SimHandler)
+    server.daemon_threads = True
+    server.sim = sim
+    server.faults = faults or FaultConfig()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟行情服务")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--symbols", type=int, default=5000, help="预先生成的代码数，请求里出现的其它代码会自动加入")
+    parser.add_argument("--vol", type=float, default=0.02, help="日波动率")
+    parser.add_argument("--corr", type=float, default=0.4, help="个股之间的相关系数")
+    parser.add_argument("--latency", type=float, default=0.0, help="平均延迟 (毫秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟标准差 (毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--dump-config", metavar="PATH", help="把生成的代码写成 stock_config.json 格式")
+    args = parser.parse_args()
+
+    codes = _default_codes(args.symbols)
+    sim = MarketSim(codes, daily_vol=args.vol, corr=args.corr)
+    if args.dump_config:
+        with open(args.dump_config, "w", encoding="utf-8") as f:
+            json.dump({"stocks": [c[2:] for c in codes[3:]]}, f, ensure_ascii=False, indent=2)
+    server = serve(sim, FaultConfig(args.latency, args.jitter, args.error_rate, args.hang_rate), port=args.port)
+    print(f"Market simulator: {len(codes)} symbols on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        sys.exit(0)
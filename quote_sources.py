@@ -0,0 +1,345 @@
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import requests
+
+# -----------------------------------------------------------------------------
+# Quote Sources (行情源)
+# -----------------------------------------------------------------------------
+# 各数据源统一输出 QuoteColumns (按列的 list，不为每个代码建 dict)，
+# sec_id 为腾讯格式 (sh600519)，amount 为成交额 (万元)，取不到时为 nan。
+TENCENT_URL = "http://qt.gtimg.cn"
+SINA_URL = "http://hq.sinajs.cn"
+EASTMONEY_URL = "http://push2.eastmoney.com"
+
+# 完整行情里的五档盘口，解析成固定布局的 23 个 float:
+# 昨收, 买1~5 (价, 量), 卖1~5 (价, 量), 成交量(手), 成交额(万)
+DEPTH_DTYPE = np.dtype([
+    ("pre_close", "f8"),
+    ("bid", "f8", (5, 2)),
+    ("ask", "f8", (5, 2)),
+    ("volume", "f8"),
+    ("amount", "f8"),
+])
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class QuoteColumns:
+    """
+    一次请求解析出的行情，每个字段一个 list；QuoteTable.fill 按列一次写入。
+    depth 为每行 23 个 float (DEPTH_DTYPE 的平铺布局)，只有展开的代码才有
+    """
+    __slots__ = ("keys", "name", "price", "pct", "change", "amount", "depth_keys", "depth")
+
+    def __init__(self):
+        self.keys, self.name, self.price, self.pct, self.change, self.amount = [], [], [], [], [], []
+        self.depth_keys, self.depth = [], []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def append(self, key, name, price, pct, change, amount):
+        self.keys.append(key)
+        self.name.append(name)
+        self.price.append(price)
+        self.pct.append(pct)
+        self.change.append(change)
+        self.amount.append(amount)
+
+    def add_depth(self, key, values):
+        self.depth_keys.append(key)
+        self.depth.append(values)
+
+    @classmethod
+    def from_records(cls, records):
+        # {sec_id: {name, price, pct, change}} (启动快照) -> QuoteColumns
+        cols = cls()
+        for key, q in records.items():
+            cols.append(key, q["name"], q["price"], q["pct"], q["change"], q.get("amount", np.nan))
+        return cols
+
+
+class QuoteSource(ABC):
+    name = ""
+    supports_depth = False
+    supports_slim = False    # 折叠的行能按 s_ 精简格式请求
+
+    def __init__(self, base_url, timeout=3):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @abstractmethod
+    def fetch(self, sec_ids, slim=False, full_codes=()):
+        """
+        返回 QuoteColumns；full_codes 里的代码要带盘口 (supports_depth 的源)
+        """
+
+
+class TencentSource(QuoteSource):
+    name = "tencent"
+    supports_depth = True
+    supports_slim = True
+
+    def __init__(self, base_url=TENCENT_URL, timeout=3):
+        super().__init__(base_url, timeout)
+
+    def fetch(self, sec_ids, slim=False, full_codes=()):
+        # s_ 精简格式和完整格式可以混在同一个请求里
+        request_codes = [f"s_{c}" if slim and c not in full_codes else c for c in sec_ids]
+        url = f"{self.base_url}/q={','.join(request_codes)}"
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        return self.parse(resp.content.decode('gbk', errors='ignore'))
+
+    @staticmethod
+    def parse(content):
+        """
+        解析腾讯行情文本，完整格式和 s_ 精简格式都支持
+        完整: v_sh600519="1~贵州茅台~600519~1760.00~...~change~pct~..."  (31: change, 32: pct)
+              4: 昨收, 6: 成交量, 9~28: 买卖五档 (价, 量), 37: 成交额 -> "depth"
+        精简: v_s_sh600519="1~贵州茅台~600519~1760.00~change~pct~vol~amount~~mktcap~GP-A"
+        """
+        result = QuoteColumns()
+        for line in content.split(';'):
+            line = line.strip()
+            if not line: continue
+
+            # extracting v_sh600519 / v_s_sh600519
+            if '=' not in line: continue
+
+            var_name, val_str = line.split('=', 1)
+            qt_code = var_name.split('_')[-1] # sh600519
+            slim = var_name.startswith('v_s_')
+
+            val_str = val_str.strip('"')
+            if slim:
+                parts = val_str.split('~')
+                if len(parts) < 6: continue
+                i_change, i_pct, i_amount = 4, 5, 7
+            else:
+                # 只需要前 38 个字段，后面的不切分
+                parts = val_str.split('~', 38)
+                if len(parts) < 38: continue
+                i_change, i_pct, i_amount = 31, 32, 37
+
+            try:
+                price, pct, change = float(parts[3]), float(parts[i_pct]), float(parts[i_change])
+            except ValueError:
+                continue
+            amount = _to_float(parts[i_amount]) if len(parts) > i_amount else np.nan
+            result.append(qt_code, parts[1], price, pct, change, amount)
+
+            if not slim:
+                # 停牌等情况盘口字段可能为空，不影响价格
+                try:
+                    result.add_depth(qt_code, [float(x) for x in [parts[4]] + parts[9:29] + [parts[6], parts[37]]])
+                except ValueError:
+                    pass
+
+        return result
+
+
+class SinaSource(QuoteSource):
+    name = "sina"
+    supports_depth = True
+
+    def __init__(self, base_url=SINA_URL, timeout=3):
+        super().__init__(base_url, timeout)
+        # 新浪接口不带 Referer 会返回 403
+        self.session.headers["Referer"] = "https://finance.sina.com.cn"
+
+    def fetch(self, sec_ids, slim=False, full_codes=()):
+        url = f"{self.base_url}/list={','.join(sec_ids)}"
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        return self.parse(resp.content.decode('gbk', errors='ignore'), full_codes)
+
+    @staticmethod
+    def parse(content, full_codes=()):
+        """
+        var hq_str_sh600519="贵州茅台,今开,昨收,现价,最高,最低,买一,卖一,成交量(股),成交额(元),
+                             买一量,买一价,...,买五价,卖一量,卖一价,...,卖五价,日期,时间,..."
+        """
+        result = QuoteColumns()
+        for line in content.split(';'):
+            line = line.strip()
+            if '=' not in line: continue
+            var_name, val_str = line.split('=', 1)
+            qt_code = var_name.split('_')[-1]
+            parts = val_str.strip('"').split(',')
+            if len(parts) < 30: continue
+            try:
+                pre_close = float(parts[2])
+                price = float(parts[3])
+            except ValueError:
+                continue
+            change = price - pre_close if pre_close else 0.0
+            result.append(qt_code, parts[0], price,
+                          round(change / pre_close * 100, 2) if pre_close else 0.0,
+                          round(change, 3),
+                          _to_float(parts[9]) / 10000)  # 元 -> 万
+
+            if qt_code in full_codes:
+                try:
+                    book = np.array(parts[10:30], dtype=float).reshape(10, 2)[:, ::-1]  # (量, 价) -> (价, 量)
+                    book[:, 1] /= 100  # 股 -> 手
+                    depth = [pre_close] + book.ravel().tolist() + [float(parts[8]) / 100, float(parts[9]) / 10000]
+                    result.add_depth(qt_code, depth)
+                except ValueError:
+                    pass
+        return result
+
+
+class EastmoneySource(QuoteSource):
+    name = "eastmoney"
+
+    MARKETS = {"sh": "1", "sz": "0", "bj": "0"}
+
+    def __init__(self, base_url=EASTMONEY_URL, timeout=3):
+        super().__init__(base_url, timeout)
+
+    def fetch(self, sec_ids, slim=False, full_codes=()):
+        # 东财的 secid 不区分深市和北交所，按 (市场, 代码) 映射回来
+        back = {}
+        secids = []
+        for c in sec_ids:
+            market = self.MARKETS.get(c[:2], "0")
+            back[(market, c[2:])] = c
+            secids.append(f"{market}.{c[2:]}")
+        params = {
+            "fltt": "2",
+            "secids": ",".join(secids),
+            "fields": "f2,f3,f4,f6,f12,f13,f14",
+        }
+        resp = self.session.get(f"{self.base_url}/api/qt/ulist.np/get", params=params, timeout=self.timeout)
+        resp.raise_for_status()
+        data = (resp.json().get("data") or {}).get("diff") or []
+
+        result = QuoteColumns()
+        for item in data:
+            key = back.get((str(item.get("f13")), str(item.get("f12"))))
+            if key is None: continue
+            try:
+                result.append(key, item["f14"], float(item["f2"]), float(item["f3"]), float(item["f4"]),
+                              _to_float(item.get("f6")) / 10000)  # 元 -> 万
+            except (KeyError, TypeError, ValueError):
+                # 停牌时价格字段是 "-"
+                pass
+        return result
+
+
+# -----------------------------------------------------------------------------
+# Hedged Fetcher (对冲请求)
+# -----------------------------------------------------------------------------
+class SourceStats:
+    """
+    最近 N 次请求的耗时；失败按超时时间记，持续变慢/出错的源自然排到后面。
+    被降级的源长时间没有新样本时清空记录；没有样本的源排序时按 0 耗时算，
+    下一次请求先发给它，恢复了就重新当主源，还是不行就再次排到后面。
+    """
+    RETRY_AFTER = 60
+
+    def __init__(self, window=50):
+        self.latencies = deque(maxlen=window)
+        self.last_record = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.last_record = time.monotonic()
+
+    def p95(self):
+        # 没有样本时返回 None
+        with self.lock:
+            if time.monotonic() - self.last_record > self.RETRY_AFTER:
+                self.latencies.clear()
+            if not self.latencies:
+                return None
+            data = sorted(self.latencies)
+        return data[min(len(data) - 1, int(len(data) * 0.95))]
+
+
+class HedgedQuoteFetcher:
+    """
+    先发给最健康的源；p95 耗时内没有返回，再发给下一个源，谁先返回用谁。
+    大部分时候只有一个请求，只有慢的那 5% 才会多发一个。
+    """
+    MIN_DEADLINE = 0.1
+    DEFAULT_DEADLINE = 0.5
+
+    def __init__(self, sources, hedge=True, timeout=3):
+        self.sources = list(sources)
+        self.hedge = hedge
+        self.timeout = timeout
+        self.stats = {s.name: SourceStats() for s in self.sources}
+        self.pool = ThreadPoolExecutor(max_workers=4 * len(self.sources), thread_name_prefix="quote")
+
+    def ranked(self, need_depth=False, slim=False):
+        """
+        源的顺序：需要盘口时能给盘口的优先；其次正在失败的 (p95 到了超时) 排后面；
+        精简模式下能用 s_ 格式的优先 (其他源每行都取完整行情)；然后按 p95 耗时，
+        没有样本的按 0 算；最后按配置顺序
+        """
+        def score(item):
+            i, s = item
+            p95 = self.stats[s.name].p95()
+            latency = 0.0 if p95 is None else p95
+            return (need_depth and not s.supports_depth, latency >= self.timeout,
+                    slim and not s.supports_slim, latency, i)
+        return [s for _, s in sorted(enumerate(self.sources), key=score)]
+
+    def _call(self, source, sec_ids, slim, full_codes):
+        start = time.perf_counter()
+        try:
+            result = source.fetch(sec_ids, slim, full_codes)
+        except Exception as e:
+            self.stats[source.name].record(self.timeout)
+            print(f"Quote source {source.name} failed: {e}")
+            return QuoteColumns()
+        self.stats[source.name].record(time.perf_counter() - start)
+        return result
+
+    def fetch(self, sec_ids, slim=False, full_codes=()):
+        if not sec_ids:
+            return QuoteColumns()
+        order = self.ranked(need_depth=bool(full_codes), slim=slim)
+        if not self.hedge:
+            order = order[:1]
+
+        launched = []
+        def launch():
+            source = order[len(launched)]
+            launched.append(source)
+            return self.pool.submit(self._call, source, sec_ids, slim, full_codes)
+
+        end = time.perf_counter() + self.timeout
+        p95 = self.stats[order[0].name].p95()
+        deadline = max(self.MIN_DEADLINE, self.DEFAULT_DEADLINE if p95 is None else p95)
+        waiting = {launch()}
+        while waiting:
+            remaining = end - time.perf_counter()
+            if remaining <= 0:
+                break
+            can_hedge = len(launched) < len(order)
+            done, waiting = wait(waiting, timeout=min(deadline, remaining) if can_hedge else remaining,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result:
+                    return result
+            # 超过 deadline 还没返回，或者返回失败：对冲到下一个源
+            if can_hedge:
+                waiting.add(launch())
+        return QuoteColumns()
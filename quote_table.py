@@ -0,0 +1,141 @@
+import threading
+
+import numpy as np
+
+from quote_sources import DEPTH_DTYPE
+
+# -----------------------------------------------------------------------------
+# Columnar Quote Table (列式行情表)
+# -----------------------------------------------------------------------------
+# QuoteWorker -> GUI 之间传的不再是每个 tick 新建的 dict-of-dicts，
+# 而是预先分配好的结构化数组，每个代码固定一行。
+QUOTE_TABLE_DTYPE = np.dtype([
+    ("name", "U16"),
+    ("price", "f8"),
+    ("pct", "f8"),
+    ("change", "f8"),
+    ("amount", "f8"),    # 成交额 (万元)
+    ("valid", "?"),      # 收到过行情
+    ("updated", "?"),    # 本 tick 收到了行情
+    ("has_depth", "?"),
+    ("depth", DEPTH_DTYPE),
+])
+
+
+class QuoteLayout:
+    """
+    代码 -> 行号，代码集合不变时一直复用同一个对象，
+    消费方可以按 layout 是否变化决定要不要重新计算行号
+    """
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self.index = {k: i for i, k in enumerate(self.keys)}
+
+    def rows(self, keys):
+        # 不在表里的代码行号为 -1
+        return np.array([self.index.get(k, -1) for k in keys], dtype=np.intp)
+
+
+class QuoteTable:
+    def __init__(self, layout):
+        self.layout = layout
+        self.data = np.zeros(len(layout.keys), dtype=QUOTE_TABLE_DTYPE)
+        self.data["price"] = np.nan
+        self.data["pct"] = np.nan
+        self.data["change"] = np.nan
+        self.data["amount"] = np.nan
+        self.seq = 0
+
+    def row(self, key):
+        return self.layout.index.get(key, -1)
+
+    def fill(self, cols):
+        """
+        cols: QuoteColumns，每列按行号一次写入，不逐行赋值
+        """
+        data = self.data
+        data["updated"] = False
+        rows = self.layout.rows(cols.keys)
+        keep = rows >= 0
+        if not keep.all():
+            rows = rows[keep]
+        if len(rows):
+            for field in ("name", "price", "pct", "change", "amount"):
+                values = np.array(getattr(cols, field), dtype=QUOTE_TABLE_DTYPE[field])
+                data[field][rows] = values if len(values) == len(rows) else values[keep]
+            data["valid"][rows] = True
+            data["updated"][rows] = True
+            data["has_depth"][rows] = False
+        if cols.depth:
+            rows = self.layout.rows(cols.depth_keys)
+            depth = np.array(cols.depth, dtype=float).view(DEPTH_DTYPE)[:, 0]
+            keep = rows >= 0
+            data["depth"][rows[keep]] = depth[keep]
+            data["has_depth"][rows[keep]] = True
+
+    def to_records(self, keys=None):
+        """
+        转回 {sec_id: {name, price, pct, change}}，只在保存快照这类低频场景使用
+        """
+        keys = self.layout.keys if keys is None else keys
+        out = {}
+        for key in keys:
+            i = self.layout.index.get(key)
+            if i is None or not self.data["valid"][i]: continue
+            r = self.data[i]
+            out[key] = {"name": str(r["name"]), "price": float(r["price"]),
+                        "pct": float(r["pct"]), "change": float(r["change"])}
+        return out
+
+
+class QuoteTableBuffer:
+    """
+    双缓冲：worker 写后台表，写完交给 GUI，GUI 用完 release 回来。
+    交接只传引用，不拷贝；正常情况下两张表轮流用，GUI 跟不上时才临时多分配一张。
+    latest 在被下一张表替换之前不会再交给 worker 重写。
+    """
+    def __init__(self, layout):
+        self.layout = layout
+        self.free = [QuoteTable(layout), QuoteTable(layout)]
+        self.latest = None
+        self.lock = threading.Lock()
+        self.seq = 0
+
+    def acquire(self):
+        with self.lock:
+            free = [t for t in self.free if t is not self.latest]
+            if free:
+                table = free[-1]
+                self.free.remove(table)
+            else:
+                table = QuoteTable(self.layout)
+        # 从上一张表继承数据，本 tick 没收到行情的代码保留旧值
+        if self.latest is not None and table is not self.latest:
+            np.copyto(table.data, self.latest.data)
+        return table
+
+    def publish(self, table):
+        self.seq += 1
+        table.seq = self.seq
+        self.latest = table
+        return table
+
+    def copy_latest(self):
+        """
+        拷贝最新一张表 (可以在 GUI 线程调用)，持锁期间它不会被 acquire 拿去重写
+        """
+        with self.lock:
+            if self.latest is None:
+                return None
+            table = QuoteTable(self.latest.layout)
+            np.copyto(table.data, self.latest.data)
+            table.seq = self.latest.seq
+            return table
+
+    def release(self, table):
+        # 可以在 GUI 线程调用；布局已经换掉的旧表直接丢弃
+        if table.layout is not self.layout:
+            return
+        with self.lock:
+            if table not in self.free and len(self.free) < 2:
+                self.free.append(table)
@@ -0,0 +1,126 @@
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+from market_sim import SIM_URL
+
+# -----------------------------------------------------------------------------
+# Whole-market Spot Snapshot (全市场快照)
+# -----------------------------------------------------------------------------
+# ak.stock_zh_a_spot_em 一次返回全部 A 股 (~5000 行)。下载一次转成列式数组，
+# 排行榜和 DataFetcher 共用，max_age 内不重复下载。
+SPOT_DTYPE = np.dtype([
+    ("code", "U6"),
+    ("name", "U16"),
+    ("price", "f8"),
+    ("pct", "f8"),
+    ("change", "f8"),
+    ("volume", "f8"),        # 手
+    ("amount", "f8"),        # 元
+    ("volume_ratio", "f8"),  # 量比
+    ("turnover", "f8"),      # 换手率 %
+])
+_SPOT_COLUMNS = {"code": "代码", "name": "名称", "price": "最新价", "pct": "涨跌幅", "change": "涨跌额",
+                 "volume": "成交量", "amount": "成交额", "volume_ratio": "量比", "turnover": "换手率"}
+SPOT_MAX_AGE = 3         # 秒，和 main.py 的刷新间隔一致
+
+
+def spot_from_df(df):
+    spot = np.zeros(len(df), dtype=SPOT_DTYPE)
+    for field, col in _SPOT_COLUMNS.items():
+        if col not in df.columns:
+            if SPOT_DTYPE[field].kind == "f":
+                spot[field] = np.nan
+            continue
+        if SPOT_DTYPE[field].kind == "U":
+            spot[field] = df[col].astype(str).to_numpy()
+        else:
+            # 停牌股的数值列是 "-" 或空
+            spot[field] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+    return spot
+
+
+class SpotSnapshot:
+    _spot = None
+    _index = {}
+    _fetched_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def fetch_df():
+        if SIM_URL:
+            import requests
+            resp = requests.get(f"{SIM_URL}/spot", timeout=10)
+            resp.raise_for_status()
+            return pd.DataFrame(resp.json())
+        import akshare as ak
+        return ak.stock_zh_a_spot_em()
+
+    @classmethod
+    def get(cls, max_age=SPOT_MAX_AGE):
+        """
+        返回 (快照数组, 代码 -> 行号, 下载时间)，三者在锁内一起取出，是同一次下载的；
+        多个线程同时过期时只下载一次，下载失败抛异常
+        """
+        with cls._lock:
+            if cls._spot is None or time.time() - cls._fetched_at > max_age:
+                df = cls.fetch_df()
+                if df is None or df.empty:
+                    raise ValueError("Returned empty dataframe")
+                spot = spot_from_df(df)
+                cls._index = {c: i for i, c in enumerate(spot["code"])}
+                cls._spot = spot
+                cls._fetched_at = time.time()
+            return cls._spot, cls._index, cls._fetched_at
+
+    @classmethod
+    def lookup(cls, code, max_age=SPOT_MAX_AGE):
+        spot, index, _ = cls.get(max_age)
+        i = index.get(code)
+        return None if i is None else spot[i]
+
+
+# -----------------------------------------------------------------------------
+# Screener (排行榜)
+# -----------------------------------------------------------------------------
+# 榜单 -> (排序字段, 从大到小)
+BOARDS = {
+    "gainers": ("pct", True),
+    "losers": ("pct", False),
+    "amount": ("amount", True),
+    "spike": ("volume_ratio", True),
+}
+
+
+def top_k(values, k, largest=True):
+    """
+    argpartition 选出前 k 个，只对这 k 个排序；nan 不参与
+    """
+    valid = np.flatnonzero(np.isfinite(values))
+    keys = -values[valid] if largest else values[valid]
+    if len(valid) > k:
+        part = np.argpartition(keys, k - 1)[:k]
+    else:
+        part = np.arange(len(valid))
+    return valid[part[np.argsort(keys[part], kind="stable")]]
+
+
+class Screener:
+    def __init__(self, k=10):
+        self.k = k
+        self.ranks = {} # board -> 上次的代码顺序
+
+    def update(self, spot):
+        """
+        返回名次有变化的榜单 {board: 快照里的前 k 行}，没变化的不返回
+        """
+        changed = {}
+        for board, (field, largest) in BOARDS.items():
+            rows = spot[top_k(spot[field], self.k, largest)]
+            codes = tuple(rows["code"])
+            if self.ranks.get(board) != codes:
+                self.ranks[board] = codes
+                changed[board] = rows
+        return changed
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from market_sim import SIM_URL
+
+# -----------------------------------------------------------------------------
+# Warm-start Snapshot (启动快照)
+# -----------------------------------------------------------------------------
+# 退出时 / 定时把最近的行情和图表存成 snapshot.npz (与 stock_config.json 同目录)，
+# 下次启动在联网之前先用它填充界面。
+# 连着模拟器时用 snapshot_sim.npz，不覆盖真实行情的快照
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot_sim.npz" if SIM_URL else "snapshot.npz")
+QUOTE_DTYPE = np.dtype([
+    ("group", "U8"),   # stocks / indices
+    ("key", "U12"),    # sh600519
+    ("name", "U16"),
+    ("price", "f8"),
+    ("pct", "f8"),
+    ("change", "f8"),
+])
+QUOTE_FIELDS = ("price", "pct", "change")
+
+
+def save_snapshot(quotes, charts, path=SNAPSHOT_PATH):
+    """
+    quotes: {"stocks": {key: {name, price, pct, change}}, "indices": {...}}
+    charts: {(code, chart_type): DataFrame}
+    """
+    rows = []
+    for group, data in quotes.items():
+        for key, q in data.items():
+            rows.append((group, key, q.get("name", ""), *(q.get(f, np.nan) for f in QUOTE_FIELDS)))
+    arrays = {"quotes": np.array(rows, dtype=QUOTE_DTYPE)}
+
+    for (code, ctype), df in charts.items():
+        if df is None or df.empty:
+            continue
+        for col in df.columns:
+            values = df[col].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[f"chart|{code}|{ctype}|{col}"] = values
+
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Error saving snapshot: {e}")
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """
+    返回 (quotes, charts)，格式同 save_snapshot；没有快照时返回空
+    """
+    quotes = {"stocks": {}, "indices": {}}
+    charts = {}
+    if not os.path.exists(path):
+        return quotes, charts
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            for r in npz["quotes"]:
+                quotes.setdefault(str(r["group"]), {})[str(r["key"])] = {
+                    "name": str(r["name"]),
+                    **{f: float(r[f]) for f in QUOTE_FIELDS},
+                }
+            columns = {}
+            for name in npz.files:
+                if not name.startswith("chart|"):
+                    continue
+                _, code, ctype, col = name.split("|", 3)
+                columns.setdefault((code, ctype), {})[col] = npz[name]
+        charts = {key: pd.DataFrame(cols) for key, cols in columns.items()}
+    except Exception as e:
+        print(f"Error loading snapshot: {e}")
+    return quotes, charts
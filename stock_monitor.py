@@ -1,13 +1,11 @@
 import sys
 import time
-import datetime
 import threading
 import ssl
 import urllib3
 import requests
 import os
 import json
-from functools import partial
 
 # -----------------------------------------------------------------------------
 # SSL / Proxy Configuration
@@ -28,12 +26,23 @@ requests.Session.request = _new_request
 # os.environ["HTTP_PROXY"] = 
 # os.environ["HTTPS_PROXY"] = 
 
-import pandas as pd
-import akshare as ak
+import numpy as np
 from PySide6 import QtCore, QtGui, QtWidgets
-from PySide6.QtCore import Qt, QThread, Signal, Slot, QPoint, QSize
+from PySide6.QtCore import Qt, QThread, Signal, Slot, QPoint
 import pyqtgraph as pg
 
+from symbol_master import SymbolMaster, KIND_INDEX
+from indicators import IndicatorCache, INDICATOR_COLUMNS, MA_PERIODS, MA_COLORS
+from alerts import AlertEngine, load_alerts, save_alerts, parse_rule, describe_rule
+from snapshot import save_snapshot, load_snapshot
+from quote_sources import HedgedQuoteFetcher, QuoteColumns, TencentSource, SinaSource, EastmoneySource
+from quote_table import QuoteLayout, QuoteTable, QuoteTableBuffer
+from history_store import HistoryStore, bars_to_df, backfill
+from timeframes import TimeframeCache, base_kind
+from market_sim import SIM_URL
+from screener import Screener, SpotSnapshot
+from fetch_pool import FetchPool
+
 # -----------------------------------------------------------------------------
 # Configuration / Constants
 # -----------------------------------------------------------------------------
@@ -44,9 +53,19 @@ INDICES = {
     "创业板指": "sz399006"
 }
 REFRESH_INTERVAL_MS = 2000     # 实时数据刷新间隔 (2秒)
+QUOTE_SLIM_MODE = True         # 折叠的行和指数用 s_ 精简行情，展开的行才取完整行情
+QUOTE_HEDGING = True           # 主源超过 p95 耗时未返回时，向备用源再发一次请求
 CHART_INTERVAL_MS = 60000      # 图表刷新间隔 (1分钟)
+CHART_ADJUST = "qfq"           # 图表复权方式：qfq 前复权 / hfq 后复权 / "" 不复权 (本地按因子表换算)
+SNAPSHOT_INTERVAL_MS = 60000   # 启动快照保存间隔 (1分钟)
+SCREENER_INTERVAL_MS = 5000    # 全市场排行刷新间隔 (5秒)
+SCREENER_TOP_K = 10
+UI_FPS = 10                    # 界面刷新帧率上限
+UI_FPS_IDLE = 2                # 窗口半透明或没有焦点时的帧率上限
+CHART_PROCESS_POOL = 2         # K 线下载/解析用的子进程数 (fetch_pool.py)，0 表示在 ChartWorker 线程里做
 BACKGROUND_COLOR = (20, 20, 20, 230)
 TEXT_COLOR = "#E0E0E0"
+STALE_COLOR = "#808080"        # 快照里的旧数据，等新行情到来前显示为灰色
 UP_COLOR = "#FF5252"
 DOWN_COLOR = "#00E676"
 BORDER_COLOR = "rgba(255, 255, 255, 30)"
@@ -60,6 +79,11 @@ class FastFetcher:
         # 腾讯接口前缀规则
         if code.startswith("sh") or code.startswith("sz") or code.startswith("bj"):
             return code
+
+        # 优先查代码表 (symbol_master.npy)，查不到再按首位数字猜
+        sec_id = SymbolMaster.resolve(code)
+        if sec_id:
+            return sec_id
             
         if code.startswith("6") or code.startswith("5") or code.startswith("9"):
             return f"sh{code}"
@@ -72,106 +96,99 @@ class FastFetcher:
             return f"bj{code}"
         return f"sz{code}" # Default
 
+    # 腾讯为主，新浪、东财为备用；按各源最近的耗时自动调整顺序
+    # 设置了 STOCK_SIM_URL 时三个源都指向本地模拟器 (market_sim.py)
+    if SIM_URL:
+        quote_fetcher = HedgedQuoteFetcher(
+            [TencentSource(SIM_URL), SinaSource(SIM_URL), EastmoneySource(SIM_URL)], hedge=QUOTE_HEDGING)
+    else:
+        quote_fetcher = HedgedQuoteFetcher(
+            [TencentSource(), SinaSource(), EastmoneySource()], hedge=QUOTE_HEDGING)
+
     @staticmethod
-    def fetch_quotes(codes_list):
+    def fetch_quotes(codes_list, slim=False, full_codes=()):
         """
-        使用 腾讯财经 (qt.gtimg.cn) 获取行情
+        获取行情，返回 QuoteColumns (按列的 list)
+        slim=True 时请求 s_ 精简格式 (约 11 个字段，完整格式 80+ 个)，
+        full_codes 里的代码仍然取完整格式；两种格式可以混在同一个请求里
         """
         if not codes_list:
-            return {}
-        
-        # 统一转换为带前缀的代码
-        request_codes = []
-        code_map = {} # request_code -> input_code (or list of input_codes)
-        
-        for c in codes_list:
-            sec_id = FastFetcher.get_sec_id(c)
-            if sec_id not in request_codes:
-                request_codes.append(sec_id)
-            if sec_id not in code_map:
-                code_map[sec_id] = []
-            code_map[sec_id].append(c)
-            
-        result = {}
-        try:
-            # 腾讯接口一次可以请求多个
-            url = f"http://qt.gtimg.cn/q={','.join(request_codes)}"
-            resp = requests.get(url, timeout=3)
-            if resp.status_code != 200:
-                return {}
-                
-            # 解析
-            # v_sh600519="1~贵州茅台~600519~1760.00~..."
-            content = resp.content.decode('gbk', errors='ignore')
-            lines = content.strip().split(';')
-            
-            for line in lines:
-                line = line.strip()
-                if not line: continue
-                
-                # extracting v_sh600519
-                if '=' not in line: continue
-                
-                var_name, val_str = line.split('=', 1)
-                qt_code = var_name.split('_')[-1] # sh600519
-                
-                val_str = val_str.strip('"')
-                parts = val_str.split('~')
-                
-                if len(parts) < 33: continue
-                
-                # 3: price, 31: change, 32: pct
-                try:
-                    name = parts[1]
-                    price = float(parts[3])
-                    change = float(parts[31])
-                    pct = float(parts[32])
-                    
-                    # 填充回 result
-                    # result 的 key 应该是 qt_code (即 get_sec_id 的返回值)
-                    result[qt_code] = {
-                        "name": name,
-                        "price": price,
-                        "pct": pct,
-                        "change": change
-                    }
-                except:
-                    pass
-                    
-            return result
-            
-        except Exception as e:
-            print(f"Quote fetch failed: {e}")
-            return {}
+            return QuoteColumns()
+        
+        # 统一转换为带前缀的代码 (去重，保持顺序)
+        request_codes = list(dict.fromkeys(FastFetcher.get_sec_id(c) for c in codes_list))
+        return FastFetcher.quote_fetcher.fetch(request_codes, slim, full_codes)
 
 # -----------------------------------------------------------------------------
 # Workers
 # -----------------------------------------------------------------------------
 class QuoteWorker(QThread):
-    quotes_signal = Signal(dict) # {code: {name, price, pct}}
+    quotes_signal = Signal(object) # QuoteTable，GUI 用完需调用 release_table
+    alert_signal = Signal(list) # [(rule, name, price, pct), ...]
     
-    def __init__(self, stock_codes):
+    def __init__(self, stock_codes, alert_rules=None):
         super().__init__()
         self.stock_codes = list(set(stock_codes)) # Unique
         # 添加指数
         self.index_ids = list(INDICES.values())
+        # 提醒规则在本线程判断，不占用 GUI 线程
+        self.alert_engine = AlertEngine(alert_rules, key_func=FastFetcher.get_sec_id)
+        self.full_codes = set() # 需要完整行情的代码 (展开的行)
+        self.buffer = None # QuoteTableBuffer，代码集合变化时重建
+        self.layout_dirty = True
         self.running = True
 
     def update_stocks(self, new_codes):
         self.stock_codes = list(set(new_codes))
+        self.layout_dirty = True
+
+    def update_alerts(self, rules):
+        self.alert_engine.set_rules(rules)
+        self.layout_dirty = True
+
+    def release_table(self, table):
+        if self.buffer is not None:
+            self.buffer.release(table)
+
+    def current_layout(self):
+        if self.layout_dirty or self.buffer is None:
+            self.layout_dirty = False
+            codes = self.stock_codes + self.alert_engine.symbols() + self.index_ids
+            keys = list(dict.fromkeys(FastFetcher.get_sec_id(c) for c in codes))
+            if self.buffer is None or tuple(keys) != self.buffer.layout.keys:
+                self.buffer = QuoteTableBuffer(QuoteLayout(keys))
+        return self.buffer.layout
+
+    def set_full(self, code, full):
+        # 整体替换集合，run() 里读取时不会看到修改到一半的状态
+        sec_id = FastFetcher.get_sec_id(code)
+        if full:
+            self.full_codes = self.full_codes | {sec_id}
+        else:
+            self.full_codes = self.full_codes - {sec_id}
 
     def run(self):
         while self.running:
             try:
-                # 1. Fetch Stocks
-                stock_data = FastFetcher.fetch_quotes(self.stock_codes)
+                # 1. Fetch Stocks + Indices (提醒规则里不在自选的代码也一起拉)，一次请求
+                layout = self.current_layout()
+                cols = FastFetcher.fetch_quotes(
+                    list(layout.keys), slim=QUOTE_SLIM_MODE, full_codes=self.full_codes)
                 
-                # 2. Fetch Indices
-                index_data = FastFetcher.fetch_quotes(self.index_ids)
+                # 2. Fill the back buffer and hand it to the GUI (只传引用)
+                buffer = self.buffer
+                table = buffer.acquire()
+                table.fill(cols)
+                buffer.publish(table)
+                self.quotes_signal.emit(table)
                 
-                # Merge
-                final_data = {"stocks": stock_data, "indices": index_data}
-                self.quotes_signal.emit(final_data)
+                # 3. Alerts
+                fired = self.alert_engine.evaluate(table)
+                if fired:
+                    self.alert_signal.emit([
+                        (rule, str(table.data["name"][row]) or rule["code"], price, pct)
+                        for rule, row, price, pct in fired
+                    ])
                 
             except Exception as e:
                 print(f"Quote loop error: {e}")
@@ -188,16 +205,19 @@ class QuoteWorker(QThread):
 class ChartWorker(QThread):
     chart_signal = Signal(str, str, object) # code, type, dataframe
     
-    def __init__(self):
+    def __init__(self, fetch=None):
         super().__init__()
-        self.queue = [] # (code, type)
+        self.fetch = fetch # FetchPool.fetch_bars，None 时在本线程下载
+        self.queue = [] # (code, type, refresh)
+        self.fetched_at = {} # (code, kind) -> 上次联网更新的时间
         self.running = True
         self.mutex = QtCore.QMutex()
         self.condition = QtCore.QWaitCondition()
 
-    def request_chart(self, code, chart_type="daily"):
+    def request_chart(self, code, chart_type="daily", refresh=False):
+        # refresh=False 时基础数据 CHART_INTERVAL_MS 内更新过就只用本地数据
         self.mutex.lock()
-        self.queue.append((code, chart_type))
+        self.queue.append((code, chart_type, refresh))
         self.condition.wakeOne()
         self.mutex.unlock()
 
@@ -210,38 +230,45 @@ class ChartWorker(QThread):
                 self.mutex.unlock()
                 continue
             
-            code, chart_type = self.queue.pop(0)
+            code, chart_type, refresh = self.queue.pop(0)
             self.mutex.unlock()
             
+            # 先用本地库立即出图，再联网增量更新
+            # 周/月 K 和 N 分钟 K 由日线 / 1 分钟线本地合成，基础数据刚更新过就不再联网
+            kind = base_kind(chart_type)
+            bars = HistoryStore.load(code, kind)
+            if bars is not None and len(bars):
+                self.chart_signal.emit(code, chart_type, self.to_chart_df(code, chart_type, bars))
+                fetched_at = self.fetched_at.get((code, kind))
+                if not refresh and fetched_at is not None and time.monotonic() - fetched_at < CHART_INTERVAL_MS / 1000:
+                    continue
+            
             # Fetch Data
             try:
-                df = None
-                if chart_type == "daily":
-                    # 日线
-                    df = ak.stock_zh_a_hist(symbol=code, period="daily", adjust="qfq")
-                    if not df.empty:
-                        df = df.tail(100) # 只取最近100天
-                elif chart_type == "min":
-                    # 分时 (这里用 1 分钟 K 线模拟分时走势，因为 trends2 接口数据格式不同，处理麻烦)
-                    # 或者使用 stock_zh_a_min
-                    df = ak.stock_zh_a_hist_min_em(symbol=code, period='1', adjust='qfq')
-                    if not df.empty:
-                        # 优先只显示当天数据
-                        try:
-                            today = datetime.datetime.now().strftime("%Y-%m-%d")
-                            # 假设 '时间' 列格式为 "YYYY-MM-DD HH:MM:SS"
-                            df_today = df[df['时间'].str.startswith(today)]
-                            if not df_today.empty:
-                                df = df_today
-                            else:
-                                df = df.tail(240)
-                        except Exception:
-                            df = df.tail(240) # Fallback
-                
-                self.chart_signal.emit(code, chart_type, df)
+                bars = HistoryStore.update(code, kind, self.fetch)
+                self.fetched_at[(code, kind)] = time.monotonic()
+                self.chart_signal.emit(code, chart_type, self.to_chart_df(code, chart_type, bars))
                 
             except Exception as e:
                 print(f"Chart fetch error for {code}: {e}")
+
+    @staticmethod
+    def to_chart_df(code, chart_type, bars):
+        bars = HistoryStore.adjusted(code, bars, CHART_ADJUST)
+        bars = TimeframeCache.get(code, chart_type, bars)
+        # 指标在本地全部历史上算 (按 (代码, 周期) 增量)，再截取显示的部分，
+        # 同一根 K 线的 MA / MACD 不随程序运行了多久而变
+        ind = IndicatorCache.update(code, chart_type, bars["ts"], bars["close"])
+        if chart_type == "min":
+            # 分时 (用 1 分钟 K 线模拟分时走势)，只显示最近一个交易日
+            days = bars["ts"].astype("M8[D]")
+            show = np.flatnonzero(days == days[-1])[0]
+        else:
+            show = max(0, len(bars) - 100) # 只取最近100根
+        df = bars_to_df(bars[show:], base_kind(chart_type))
+        for key in INDICATOR_COLUMNS:
+            df[key] = ind[key][show:]
+        return df
             
     def stop(self):
         self.running = False
@@ -250,6 +277,61 @@ class ChartWorker(QThread):
         self.mutex.unlock()
         self.wait()
 
+class ScreenerWorker(QThread):
+    ranks_signal = Signal(object) # {board: 前 k 行}，只含名次变化了的榜单
+    
+    def __init__(self):
+        super().__init__()
+        self.screener = Screener(SCREENER_TOP_K)
+        self.active = False # 排行面板显示时才下载快照
+        self.wake = False # 刚切到排行面板，不等这一轮睡完
+        self.running = True
+        
+    def set_active(self, active):
+        self.wake = active and not self.active
+        self.active = active
+        
+    def run(self):
+        while self.running:
+            self.wake = False
+            if self.active:
+                try:
+                    spot, _, _ = SpotSnapshot.get(max_age=SCREENER_INTERVAL_MS / 1000)
+                    changed = self.screener.update(spot)
+                    if changed:
+                        self.ranks_signal.emit(changed)
+                except Exception as e:
+                    print(f"Screener error: {e}")
+            for _ in range(SCREENER_INTERVAL_MS // 100):
+                # 下载失败也睡满一轮，不要连续重试
+                if not self.running or self.wake:
+                    break
+                self.msleep(100)
+                
+    def stop(self):
+        self.running = False
+        self.wait()
+
+class BackfillWorker(QThread):
+    progress_signal = Signal(int, int) # done, total
+    
+    def __init__(self, codes, fetch=None):
+        super().__init__()
+        self.codes = list(codes)
+        self.fetch = fetch
+        self.running = True
+        
+    def run(self):
+        failed = backfill(self.codes,
+                          progress=lambda done, total, *_: self.progress_signal.emit(done, total),
+                          should_stop=lambda: not self.running, fetch=self.fetch)
+        if failed:
+            print(f"Backfill failed: {failed}")
+            
+    def stop(self):
+        self.running = False
+        self.wait()
+
 # -----------------------------------------------------------------------------
 # UI Components
 # -----------------------------------------------------------------------------
@@ -280,15 +362,410 @@ class CandlestickItem(pg.GraphicsObject):
     def boundingRect(self):
         return QtCore.QRectF(self.picture.boundingRect())
 
+class DepthPanel(QtWidgets.QWidget):
+    """
+    五档盘口：左边买一~买五，右边卖一~卖五
+    每个 tick 只改变化了的格子
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        grid = QtWidgets.QGridLayout(self)
+        grid.setContentsMargins(5, 0, 5, 0)
+        grid.setHorizontalSpacing(6)
+        grid.setVerticalSpacing(0)
+        
+        self.cells = [] # [(price_label, vol_label), ...] 买1~5, 卖1~5
+        self.texts = {} # label -> (text, color)
+        for side, col in [("买", 0), ("卖", 3)]:
+            for i in range(5):
+                name = QtWidgets.QLabel(f"{side}{'一二三四五'[i]}")
+                price = QtWidgets.QLabel("--")
+                vol = QtWidgets.QLabel("--")
+                for lbl in (name, price, vol):
+                    lbl.setStyleSheet(f"color: {TEXT_COLOR}; font-size: 10px;")
+                price.setAlignment(Qt.AlignRight)
+                vol.setAlignment(Qt.AlignRight)
+                grid.addWidget(name, i, col)
+                grid.addWidget(price, i, col + 1)
+                grid.addWidget(vol, i, col + 2)
+                self.cells.append((price, vol))
+        
+        self.lbl_total = QtWidgets.QLabel("")
+        self.lbl_total.setStyleSheet(f"color: {TEXT_COLOR}; font-size: 10px;")
+        grid.addWidget(self.lbl_total, 5, 0, 1, 6)
+        
+    def _set(self, lbl, text, color=TEXT_COLOR):
+        if self.texts.get(lbl) == (text, color):
+            return
+        old = self.texts.get(lbl)
+        if old is None or old[0] != text:
+            lbl.setText(text)
+        if old is None or old[1] != color:
+            lbl.setStyleSheet(f"color: {color}; font-size: 10px;")
+        self.texts[lbl] = (text, color)
+        
+    def update_depth(self, depth):
+        pre_close = depth["pre_close"]
+        levels = np.concatenate([depth["bid"], depth["ask"]])
+        for (lbl_price, lbl_vol), (price, vol) in zip(self.cells, levels):
+            if price > 0:
+                color = UP_COLOR if price > pre_close else DOWN_COLOR if price < pre_close else TEXT_COLOR
+                self._set(lbl_price, f"{price:.2f}", color)
+                self._set(lbl_vol, f"{int(vol)}")
+            else:
+                self._set(lbl_price, "--")
+                self._set(lbl_vol, "--")
+        self._set(self.lbl_total, f"成交量 {depth['volume'] / 10000:.2f}万手  成交额 {depth['amount'] / 10000:.2f}亿")
+
+class HeatmapWidget(QtWidgets.QWidget):
+    """
+    自选股热力图：每个代码一个色块，按涨跌幅着色，可选按成交额决定面积
+    整张图由这一个控件画，一次 paintEvent 只画与脏区域相交的色块；
+    代码集合 / 尺寸变化时才重新排布，每个 tick 只把变化了的色块标脏
+    """
+    LEVELS = 20     # 每 0.5% 一档，±10% 封顶
+    GAP = 1
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.keys = ()
+        self.names = ()
+        self.layout_ref = None # 计算 rows 时的 QuoteLayout
+        self.rows = np.zeros(0, dtype=np.intp)
+        self.rects = np.zeros((0, 4)) # x, y, w, h
+        self.pct = np.zeros(0)
+        self.amount = np.zeros(0)
+        self.labels = [] # 每个色块的 (名称, 涨跌幅) 文本
+        self.stale = False
+        self.size_by_amount = False
+        self.weighted = False # 排布时是否已经有成交额
+        
+        # 预先生成各档颜色，按档位取 brush
+        bg = QtGui.QColor(*BACKGROUND_COLOR[:3])
+        self.brushes = {}
+        for level in range(-self.LEVELS, self.LEVELS + 1):
+            base = QtGui.QColor(UP_COLOR if level >= 0 else DOWN_COLOR)
+            t = 0.25 + 0.75 * abs(level) / self.LEVELS
+            color = QtGui.QColor(
+                int(bg.red() + (base.red() - bg.red()) * t),
+                int(bg.green() + (base.green() - bg.green()) * t),
+                int(bg.blue() + (base.blue() - bg.blue()) * t))
+            self.brushes[level] = QtGui.QBrush(color)
+        self.brushes[0] = QtGui.QBrush(bg.lighter(250)) # 平盘 / 还没有行情
+        self.stale_brush = QtGui.QBrush(QtGui.QColor(STALE_COLOR).darker(200))
+        self.bg_brush = QtGui.QBrush(bg)
+        self.text_pen = QtGui.QPen(QtGui.QColor(TEXT_COLOR))
+        self.label_font = QtGui.QFont(self.font())
+        self.label_font.setPixelSize(10)
+        
+    def set_symbols(self, keys, names):
+        """
+        keys: sec_id 列表，names: 行情到来之前显示的名称 (代码)
+        """
+        self.keys = tuple(keys)
+        self.names = list(names)
+        self.layout_ref = None
+        self.pct = np.full(len(self.keys), np.nan)
+        self.amount = np.full(len(self.keys), np.nan)
+        self.labels = [(n, "") for n in self.names]
+        self.relayout()
+        
+    def set_size_by_amount(self, on):
+        self.size_by_amount = on
+        self.relayout()
+        
+    def relayout(self):
+        n = len(self.keys)
+        w, h = self.width(), self.height()
+        weights = np.nan_to_num(self.amount, nan=0.0) if self.size_by_amount else None
+        self.weighted = weights is not None and bool((weights > 0).any())
+        if not n:
+            self.rects = np.zeros((0, 4))
+        elif self.weighted:
+            # 没有成交额的 (停牌等) 给一个最小面积
+            floor = weights[weights > 0].min()
+            self.rects = self._treemap(np.maximum(weights, floor), 0, 0, w, h)
+        else:
+            cols = max(1, int(np.ceil(np.sqrt(n * w / max(h, 1)))))
+            rows = int(np.ceil(n / cols))
+            i = np.arange(n)
+            cw, ch = w / cols, h / rows
+            self.rects = np.column_stack([i % cols * cw, i // cols * ch, np.full(n, cw), np.full(n, ch)])
+        self.update()
+        
+    @staticmethod
+    def _treemap(weights, x, y, w, h):
+        """
+        二分 treemap：按权重降序，每次把剩下的块分成权重相近的两半，沿长边切开
+        """
+        rects = np.zeros((len(weights), 4))
+        order = np.argsort(-weights, kind="stable")
+        stack = [(order, x, y, w, h)]
+        while stack:
+            idx, x, y, w, h = stack.pop()
+            if len(idx) == 1:
+                rects[idx[0]] = (x, y, w, h)
+                continue
+            cum = np.cumsum(weights[idx])
+            k = int(np.clip(np.searchsorted(cum, cum[-1] / 2), 1, len(idx) - 1))
+            frac = cum[k - 1] / cum[-1]
+            if w >= h:
+                stack.append((idx[:k], x, y, w * frac, h))
+                stack.append((idx[k:], x + w * frac, y, w * (1 - frac), h))
+            else:
+                stack.append((idx[:k], x, y, w, h * frac))
+                stack.append((idx[k:], x, y + h * frac, w, h * (1 - frac)))
+        return rects
+        
+    def update_table(self, table, stale=False):
+        if not len(self.keys) or not len(table.data):
+            return
+        if table.layout is not self.layout_ref:
+            self.layout_ref = table.layout
+            self.rows = table.layout.rows(self.keys)
+        present = self.rows >= 0
+        rows = np.where(present, self.rows, 0)
+        data = table.data
+        valid = present & data["valid"][rows]
+        pct = np.where(valid, data["pct"][rows], np.nan)
+        self.amount = np.where(valid, data["amount"][rows], self.amount)
+        
+        # 涨跌幅变了的色块才重画 (nan 视为相同)
+        dirty = ~((pct == self.pct) | (np.isnan(pct) & np.isnan(self.pct)))
+        if stale != self.stale:
+            dirty[:] = True
+        self.pct = pct
+        self.stale = stale
+        
+        if self.size_by_amount and not self.weighted and np.isfinite(self.amount).any():
+            # 第一次拿到成交额，按成交额重新排布一次
+            self.update_labels(np.flatnonzero(dirty), data, rows)
+            self.relayout()
+            return
+        idx = np.flatnonzero(dirty)
+        if not len(idx):
+            return
+        self.update_labels(idx, data, rows)
+        if len(idx) > len(self.keys) // 2:
+            self.update()
+            return
+        for x, y, w, h in self.rects[idx]:
+            self.update(int(x), int(y), int(np.ceil(w)) + 1, int(np.ceil(h)) + 1)
+            
+    def update_labels(self, idx, data, rows):
+        for i in idx:
+            pct = self.pct[i]
+            if np.isnan(pct):
+                self.labels[i] = (self.names[i], "")
+            else:
+                self.labels[i] = (str(data["name"][rows[i]]) or self.names[i], f"{pct:+.2f}%")
+                
+    def resizeEvent(self, event):
+        self.relayout()
+        super().resizeEvent(event)
+        
+    def paintEvent(self, event):
+        p = QtGui.QPainter(self)
+        clip = event.rect()
+        p.fillRect(clip, self.bg_brush)
+        if not len(self.rects):
+            p.end()
+            return
+        
+        # 只画和重绘区域相交的色块
+        r = self.rects
+        hit = np.flatnonzero((r[:, 0] < clip.right() + 1) & (r[:, 0] + r[:, 2] > clip.left()) &
+                             (r[:, 1] < clip.bottom() + 1) & (r[:, 1] + r[:, 3] > clip.top()))
+        pct = self.pct[hit]
+        levels = np.clip(np.rint(np.nan_to_num(pct) * 2), -self.LEVELS, self.LEVELS).astype(int)
+        
+        p.setFont(self.label_font)
+        p.setPen(self.text_pen)
+        gap = self.GAP
+        for i, level, v in zip(hit, levels, pct):
+            x, y, w, h = r[i]
+            rect = QtCore.QRectF(x + gap, y + gap, w - 2 * gap, h - 2 * gap)
+            if self.stale:
+                brush = self.stale_brush
+            elif np.isnan(v):
+                brush = self.brushes[0]
+            else:
+                brush = self.brushes[level]
+            p.fillRect(rect, brush)
+            if w >= 36 and h >= 14:
+                name, text = self.labels[i]
+                if h >= 28 and text:
+                    p.drawText(rect, Qt.AlignCenter, f"{name}\n{text}")
+                else:
+                    p.drawText(rect, Qt.AlignCenter, text or name)
+        p.end()
+
+class ScreenerPanel(QtWidgets.QWidget):
+    """
+    全市场排行：涨幅 / 跌幅 / 成交额 / 量比 前 k 名，每行一个「+」加入自选
+    名次没变的榜单不会发过来，界面也就不动
+    """
+    add_signal = Signal(str) # code
+    
+    BOARD_NAMES = {"gainers": "涨幅", "losers": "跌幅", "amount": "成交额", "spike": "量比"}
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.board = "gainers"
+        self.boards = {} # board -> 最近一次的前 k 行
+        self.codes = [None] * SCREENER_TOP_K # 每行当前显示的代码
+        self.texts = {} # label -> (text, color)
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(2)
+        
+        tabs = QtWidgets.QHBoxLayout()
+        tabs.setSpacing(2)
+        self.tab_group = QtWidgets.QButtonGroup(self)
+        for board, title in self.BOARD_NAMES.items():
+            btn = QtWidgets.QPushButton(title)
+            btn.setCheckable(True)
+            btn.setChecked(board == self.board)
+            btn.setFixedSize(40, 20)
+            btn.setStyleSheet(f"""
+                QPushButton {{
+                    background-color: rgba(255,255,255,20);
+                    color: {TEXT_COLOR}; border: none; border-radius: 3px; font-size: 10px;
+                }}
+                QPushButton:checked {{ background-color: rgba(255,255,255,60); }}
+            """)
+            btn.clicked.connect(lambda _=False, b=board: self.switch_board(b))
+            self.tab_group.addButton(btn)
+            tabs.addWidget(btn)
+        tabs.addStretch()
+        layout.addLayout(tabs)
+        
+        self.rows = [] # [(name, price, metric), ...]
+        for i in range(SCREENER_TOP_K):
+            row = QtWidgets.QHBoxLayout()
+            row.setContentsMargins(5, 0, 5, 0)
+            name = QtWidgets.QLabel("--")
+            price = QtWidgets.QLabel("")
+            metric = QtWidgets.QLabel("")
+            for lbl in (name, price, metric):
+                lbl.setStyleSheet(f"color: {TEXT_COLOR}; font-size: 11px;")
+            price.setAlignment(Qt.AlignRight)
+            metric.setAlignment(Qt.AlignRight)
+            metric.setFixedWidth(60)
+            btn_add = QtWidgets.QPushButton("+")
+            btn_add.setFixedSize(18, 18)
+            btn_add.setStyleSheet(f"background-color: rgba(255,255,255,20); color: {TEXT_COLOR}; border: none; border-radius: 3px;")
+            btn_add.clicked.connect(lambda _=False, i=i: self.on_add(i))
+            row.addWidget(name)
+            row.addStretch()
+            row.addWidget(price)
+            row.addWidget(metric)
+            row.addWidget(btn_add)
+            layout.addLayout(row)
+            self.rows.append((name, price, metric))
+        layout.addStretch()
+        
+    def _set(self, lbl, text, color=TEXT_COLOR):
+        old = self.texts.get(lbl)
+        if old == (text, color):
+            return
+        if old is None or old[0] != text:
+            lbl.setText(text)
+        if old is None or old[1] != color:
+            lbl.setStyleSheet(f"color: {color}; font-size: 11px;")
+        self.texts[lbl] = (text, color)
+        
+    def update_boards(self, changed):
+        self.boards.update(changed)
+        if self.board in changed:
+            self.render()
+            
+    def switch_board(self, board):
+        self.board = board
+        self.render()
+        
+    def render(self):
+        rows = self.boards.get(self.board)
+        if rows is None:
+            return
+        for i, (lbl_name, lbl_price, lbl_metric) in enumerate(self.rows):
+            if i >= len(rows):
+                self.codes[i] = None
+                self._set(lbl_name, "--")
+                self._set(lbl_price, "")
+                self._set(lbl_metric, "")
+                continue
+            r = rows[i]
+            pct = float(r["pct"])
+            color = UP_COLOR if pct >= 0 else DOWN_COLOR
+            if self.board == "amount":
+                metric = f"{r['amount'] / 1e8:.1f}亿"
+            elif self.board == "spike":
+                metric = f"{r['volume_ratio']:.2f}"
+            else:
+                metric = f"{pct:+.2f}%"
+            self.codes[i] = str(r["code"])
+            self._set(lbl_name, f"{r['name']}")
+            self._set(lbl_price, f"{r['price']:.2f}", color)
+            self._set(lbl_metric, metric, color)
+            
+    def on_add(self, i):
+        if self.codes[i]:
+            self.add_signal.emit(self.codes[i])
+
+class AddStockDialog(QtWidgets.QDialog):
+    """
+    添加股票：输入代码 / 名称 / 拼音首字母，实时从代码表里搜索
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("添加")
+        self.setStyleSheet(f"background-color: rgb(40,40,40); color: {TEXT_COLOR};")
+        self.resize(240, 260)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(6, 6, 6, 6)
+        self.edit = QtWidgets.QLineEdit()
+        self.edit.setPlaceholderText("代码 / 名称 / 拼音首字母")
+        self.results = QtWidgets.QListWidget()
+        layout.addWidget(self.edit)
+        layout.addWidget(self.results)
+
+        self.edit.textChanged.connect(self.on_text_changed)
+        self.edit.returnPressed.connect(self.accept)
+        self.results.itemActivated.connect(lambda _: self.accept())
+
+    def on_text_changed(self, text):
+        self.results.clear()
+        for qt_code, code, name, kind in SymbolMaster.search(text, limit=20):
+            # 指数和个股可能同代码 (000001)，指数保存完整代码
+            value = qt_code if kind == KIND_INDEX else code
+            item = QtWidgets.QListWidgetItem(f"{qt_code}  {name}")
+            item.setData(Qt.UserRole, value)
+            self.results.addItem(item)
+        if self.results.count():
+            self.results.setCurrentRow(0)
+
+    def selected_code(self):
+        item = self.results.currentItem()
+        if item is not None:
+            return item.data(Qt.UserRole)
+        # 代码表里没有 (或还没建好) 就按输入原样添加
+        return self.edit.text().strip()
+
 class StockItemWidget(QtWidgets.QWidget):
     expand_signal = Signal(str, bool) # code, expanded
     
-    def __init__(self, code, parent_worker):
+    def __init__(self, code, parent_worker, chart_cache=None):
         super().__init__()
         self.code = code
         self.worker = parent_worker
+        self.chart_cache = chart_cache if chart_cache is not None else {} # (code, type) -> df
+        self.row = -1 # 在 QuoteTable 里的行号，由 StockMonitor 按 layout 计算
         self.expanded = False
-        self.chart_type = "min" # min or daily
+        self.chart_type = "min" # timeframes.TIMEFRAMES 里的周期
         
         self.chart_timer = QtCore.QTimer(self)
         self.chart_timer.setInterval(CHART_INTERVAL_MS)
@@ -298,7 +775,7 @@ class StockItemWidget(QtWidgets.QWidget):
         
     def refresh_chart(self):
         if self.expanded and self.isVisible():
-            self.worker.request_chart(self.code, self.chart_type)
+            self.worker.request_chart(self.code, self.chart_type, refresh=True)
 
     def setup_ui(self):
         self.layout = QtWidgets.QVBoxLayout(self)
@@ -318,6 +795,7 @@ class StockItemWidget(QtWidgets.QWidget):
         self.lbl_price.setStyleSheet(f"color: {TEXT_COLOR}; font-weight: bold;")
         self.lbl_pct = QtWidgets.QLabel("0.00%")
         self.lbl_pct.setStyleSheet(f"color: {TEXT_COLOR};")
+        self.shown = (None, None, None, None) # 上次显示的 (名称, 价格, 涨跌幅, 颜色)
         
         self.info_layout.addWidget(self.lbl_name)
         self.info_layout.addStretch()
@@ -327,60 +805,88 @@ class StockItemWidget(QtWidgets.QWidget):
         
         self.layout.addWidget(self.info_widget)
         
-        # 2. Chart Container (Hidden by default)
+        # 2. Chart Container (第一次展开时才创建，见 setup_chart)
+        self.chart_container = None
+        
+        # Click Event
+        self.info_widget.mousePressEvent = self.on_click
+        
+    def setup_chart(self):
+        # 几千行自选股时，每行预先建好图表和盘口太慢也太占内存
         self.chart_container = QtWidgets.QWidget()
-        self.chart_container.hide()
         self.chart_layout = QtWidgets.QVBoxLayout(self.chart_container)
         self.chart_layout.setContentsMargins(0, 5, 0, 5)
         
         # Controls
         self.controls_layout = QtWidgets.QHBoxLayout()
+        self.controls_layout.setSpacing(2)
         self.btn_min = QtWidgets.QPushButton("分时")
         self.btn_day = QtWidgets.QPushButton("日K")
-        for btn in [self.btn_min, self.btn_day]:
+        # 其余周期都由本地日线 / 1 分钟线合成
+        self.chart_buttons = {
+            "min": self.btn_min,
+            "5min": QtWidgets.QPushButton("5分"),
+            "15min": QtWidgets.QPushButton("15分"),
+            "30min": QtWidgets.QPushButton("30分"),
+            "60min": QtWidgets.QPushButton("60分"),
+            "daily": self.btn_day,
+            "weekly": QtWidgets.QPushButton("周K"),
+            "monthly": QtWidgets.QPushButton("月K"),
+        }
+        self.btn_group = QtWidgets.QButtonGroup(self)
+        for ctype, btn in self.chart_buttons.items():
             btn.setCheckable(True)
-            btn.setFixedSize(40, 20)
+            btn.setFixedSize(28, 20)
             btn.setStyleSheet(f"""
                 QPushButton {{
                     background-color: rgba(255,255,255,20);
-                    color: {TEXT_COLOR}; border: none; border-radius: 3px;
+                    color: {TEXT_COLOR}; border: none; border-radius: 3px; font-size: 10px;
                 }}
                 QPushButton:checked {{ background-color: rgba(255,255,255,60); }}
             """)
-        
+            self.btn_group.addButton(btn)
+            btn.clicked.connect(lambda _=False, c=ctype: self.switch_chart(c))
+            self.controls_layout.addWidget(btn)
         self.btn_min.setChecked(True)
-        self.btn_group = QtWidgets.QButtonGroup(self)
-        self.btn_group.addButton(self.btn_min)
-        self.btn_group.addButton(self.btn_day)
         
-        self.btn_min.clicked.connect(lambda: self.switch_chart("min"))
-        self.btn_day.clicked.connect(lambda: self.switch_chart("daily"))
-        
-        self.controls_layout.addWidget(self.btn_min)
-        self.controls_layout.addWidget(self.btn_day)
         self.controls_layout.addStretch()
         
         self.chart_layout.addLayout(self.controls_layout)
         
-        # Graph
+        # Graph (主图 + 成交量 + MACD)
         self.graph_widget = pg.GraphicsLayoutWidget()
         self.graph_widget.setBackground(None)
-        self.graph_widget.setFixedHeight(120)
+        self.graph_widget.setFixedHeight(200)
         self.graph_widget.ci.layout.setContentsMargins(0, 0, 0, 0)
-        self.plot_item = self.graph_widget.addPlot()
-        self.plot_item.hideAxis('bottom')
-        self.plot_item.showGrid(x=False, y=True, alpha=0.3)
+        self.graph_widget.ci.layout.setSpacing(0)
+        self.plot_item = self.graph_widget.addPlot(row=0, col=0)
+        self.vol_plot = self.graph_widget.addPlot(row=1, col=0)
+        self.macd_plot = self.graph_widget.addPlot(row=2, col=0)
+        for plot in [self.plot_item, self.vol_plot, self.macd_plot]:
+            plot.hideAxis('bottom')
+            plot.showGrid(x=False, y=True, alpha=0.3)
+            plot.setMouseEnabled(x=False, y=False)
+        for plot in [self.vol_plot, self.macd_plot]:
+            plot.setXLink(self.plot_item)
+            plot.getAxis('left').setStyle(showValues=False)
+        self.graph_widget.ci.layout.setRowStretchFactor(0, 3)
+        self.graph_widget.ci.layout.setRowStretchFactor(1, 1)
+        self.graph_widget.ci.layout.setRowStretchFactor(2, 1)
         
         self.chart_layout.addWidget(self.graph_widget)
-        self.layout.addWidget(self.chart_container)
         
-        # Click Event
-        self.info_widget.mousePressEvent = self.on_click
+        # Depth (展开时行情取完整格式，带五档盘口)
+        self.depth_panel = DepthPanel()
+        self.chart_layout.addWidget(self.depth_panel)
+        self.layout.addWidget(self.chart_container)
         
     def on_click(self, event):
         self.expanded = not self.expanded
         if self.expanded:
+            if self.chart_container is None:
+                self.setup_chart()
             self.chart_container.show()
+            self.show_cached_chart()
             self.worker.request_chart(self.code, self.chart_type)
             self.chart_timer.start()
         else:
@@ -391,37 +897,138 @@ class StockItemWidget(QtWidgets.QWidget):
     def switch_chart(self, ctype):
         self.chart_type = ctype
         if self.expanded:
+            self.show_cached_chart()
             self.worker.request_chart(self.code, ctype)
             
-    def update_quote(self, data):
-        # data: {name, price, pct, ...}
-        self.lbl_name.setText(data['name'])
-        self.lbl_price.setText(str(data['price']))
-        pct = data['pct']
-        self.lbl_pct.setText(f"{pct:+.2f}%")
+    def show_cached_chart(self):
+        # 先画缓存 (含启动快照)，网络数据回来后再覆盖
+        df = self.chart_cache.get((self.code, self.chart_type))
+        if df is not None:
+            self.update_chart(self.chart_type, df)
+            
+    def update_quote(self, data, stale=False):
+        # data: QuoteTable 的一行 (name, price, pct, ..., depth)
+        # 只更新有变化的标签，setText / setStyleSheet 每次都会触发重排和重绘
+        pct = float(data['pct'])
+        if stale:
+            color = STALE_COLOR
+        else:
+            color = UP_COLOR if pct >= 0 else DOWN_COLOR
+        shown = (str(data['name']), str(float(data['price'])), f"{pct:+.2f}%", color)
+        name, price, pct_text, old_color = self.shown
+        if shown[0] != name:
+            self.lbl_name.setText(shown[0])
+        if shown[1] != price:
+            self.lbl_price.setText(shown[1])
+        if shown[2] != pct_text:
+            self.lbl_pct.setText(shown[2])
+        if color != old_color:
+            self.lbl_price.setStyleSheet(f"color: {color}; font-weight: bold;")
+            self.lbl_pct.setStyleSheet(f"color: {color};")
+        self.shown = shown
         
-        color = UP_COLOR if pct >= 0 else DOWN_COLOR
-        self.lbl_price.setStyleSheet(f"color: {color}; font-weight: bold;")
-        self.lbl_pct.setStyleSheet(f"color: {color};")
+        if data['has_depth'] and self.expanded:
+            self.depth_panel.update_depth(data['depth'])
         
     def update_chart(self, ctype, df):
-        if ctype != self.chart_type or df is None: return
+        if ctype != self.chart_type or df is None or self.chart_container is None: return
         self.plot_item.clear()
+        self.vol_plot.clear()
+        self.macd_plot.clear()
+        if df.empty: return
+        
+        opens = df['开盘'].astype(float).values
+        closes = df['收盘'].astype(float).values
+        x = np.arange(len(closes))
         
-        if ctype == "daily":
+        if ctype != "min":
             # Draw Candles
-            candle_data = []
-            for i in range(len(df)):
-                row = df.iloc[i]
-                candle_data.append((i, float(row['开盘']), float(row['收盘']), float(row['最低']), float(row['最高'])))
+            highs = df['最高'].astype(float).values
+            lows = df['最低'].astype(float).values
+            candle_data = list(zip(x, opens, closes, lows, highs))
             item = CandlestickItem(candle_data)
             self.plot_item.addItem(item)
         else:
             # Draw Line (Close price for Min)
-            prices = df['收盘'].astype(float).values
-            self.plot_item.plot(prices, pen=pg.mkPen(color=UP_COLOR if prices[-1] >= prices[0] else DOWN_COLOR, width=1.5))
+            self.plot_item.plot(closes, pen=pg.mkPen(color=UP_COLOR if closes[-1] >= closes[0] else DOWN_COLOR, width=1.5))
+        
+        # 指标由 ChartWorker 在全部历史上算好，随 df 一起传过来 (旧快照里没有)
+        has_ind = all(key in df.columns for key in INDICATOR_COLUMNS)
+        if has_ind:
+            for n in MA_PERIODS:
+                self.plot_item.plot(x, df[f"ma{n}"].values, pen=pg.mkPen(color=MA_COLORS[n], width=1), connect='finite')
+        
+        # 成交量
+        if '成交量' in df.columns:
+            up = closes >= opens
+            brushes = [pg.mkBrush(UP_COLOR) if u else pg.mkBrush(DOWN_COLOR) for u in up]
+            vols = df['成交量'].astype(float).values
+            self.vol_plot.addItem(pg.BarGraphItem(x=x, height=vols, width=0.6, brushes=brushes, pens=[None] * len(x)))
+        
+        # MACD
+        if has_ind:
+            macd = df["macd"].values
+            brushes = [pg.mkBrush(UP_COLOR) if v >= 0 else pg.mkBrush(DOWN_COLOR) for v in macd]
+            self.macd_plot.addItem(pg.BarGraphItem(x=x, height=macd, width=0.4, brushes=brushes, pens=[None] * len(x)))
+            self.macd_plot.plot(x, df["dif"].values, pen=pg.mkPen(color=MA_COLORS[5], width=1))
+            self.macd_plot.plot(x, df["dea"].values, pen=pg.mkPen(color=MA_COLORS[10], width=1))
 
 
+# -----------------------------------------------------------------------------
+# UI Update Pump
+# -----------------------------------------------------------------------------
+class UpdatePump(QtCore.QObject):
+    """
+    收集行情和图表更新，按帧率上限合并成一批应用。
+    一帧内同一张行情表 / 同一张图的多次更新只保留最后一次，
+    被跳过的行情表的 updated 标记并到最新一张上，不丢行。
+    """
+    def __init__(self, apply_table, apply_chart, release_table, parent=None):
+        super().__init__(parent)
+        self.apply_table = apply_table
+        self.apply_chart = apply_chart
+        self.release_table = release_table
+        self.fps = UI_FPS
+        self.table = None
+        self.charts = {} # (code, type) -> df
+        self.last_frame = 0.0
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        
+    def set_fps(self, fps):
+        self.fps = fps
+        
+    def push_table(self, table):
+        old, self.table = self.table, table
+        if old is not None:
+            if old.layout is table.layout:
+                table.data["updated"] |= old.data["updated"]
+            self.release_table(old)
+        self.schedule()
+        
+    def push_chart(self, code, ctype, df):
+        self.charts[(code, ctype)] = df
+        self.schedule()
+        
+    def schedule(self):
+        if self.timer.isActive():
+            return
+        wait = self.last_frame + 1.0 / self.fps - time.monotonic()
+        self.timer.start(max(0, int(wait * 1000)))
+        
+    def flush(self):
+        self.last_frame = time.monotonic()
+        table, self.table = self.table, None
+        charts, self.charts = self.charts, {}
+        if table is not None:
+            try:
+                self.apply_table(table)
+            finally:
+                self.release_table(table)
+        for (code, ctype), df in charts.items():
+            self.apply_chart(code, ctype, df)
+
 # -----------------------------------------------------------------------------
 # Main Window
 # -----------------------------------------------------------------------------
@@ -429,22 +1036,50 @@ class StockMonitor(QtWidgets.QWidget):
     def __init__(self):
         super().__init__()
         self.stocks = self.load_stocks()
+        self.alerts = load_alerts()
+        self.quote_layout = None # 当前行号对应的 QuoteLayout
+        self.index_rows = {} # 指数名 -> 行号
+        self.chart_cache = {} # (code, type) -> df
+        self.backfill_worker = None
         self.dragging = False
         self.offset = QPoint()
+
+        # 代码表：先用本地文件，过期了在后台增量刷新
+        SymbolMaster.load()
+        if SymbolMaster.is_stale():
+            threading.Thread(target=SymbolMaster.refresh, daemon=True).start()
         
         self.setup_ui()
         self.setup_workers()
         
+        self.snapshot_timer = QtCore.QTimer(self)
+        self.snapshot_timer.setInterval(SNAPSHOT_INTERVAL_MS)
+        self.snapshot_timer.timeout.connect(self.save_snapshot)
+        self.snapshot_timer.start()
+        
         # Initial transparency
         self.setWindowOpacity(0.4)
+        self.update_frame_rate()
 
     def enterEvent(self, event):
         self.setWindowOpacity(1.0)
+        self.update_frame_rate()
         super().enterEvent(event)
 
     def leaveEvent(self, event):
         self.setWindowOpacity(0.4)
+        self.update_frame_rate()
         super().leaveEvent(event)
+
+    def changeEvent(self, event):
+        if event.type() == QtCore.QEvent.ActivationChange:
+            self.update_frame_rate()
+        super().changeEvent(event)
+
+    def update_frame_rate(self):
+        # 半透明或没有焦点时没人细看，降低刷新帧率
+        idle = self.windowOpacity() < 1.0 or not self.isActiveWindow()
+        self.pump.set_fps(UI_FPS_IDLE if idle else UI_FPS)
         
     def setup_ui(self):
         # Allow resizing, keep on top if desired (optional)
@@ -482,6 +1117,11 @@ class StockMonitor(QtWidgets.QWidget):
             lbl.setStyleSheet(f"color: {TEXT_COLOR}; font-size: 10px;")
             self.indices_layout.addWidget(lbl)
             self.index_labels[name] = lbl
+        self.indices_layout.addStretch()
+        self.lbl_status = QtWidgets.QLabel("")
+        self.lbl_status.setStyleSheet(f"color: {TEXT_COLOR}; font-size: 10px;")
+        self.lbl_status.hide()
+        self.indices_layout.addWidget(self.lbl_status)
         self.frame_layout.addWidget(self.indices_widget)
         
         # Separator
@@ -505,24 +1145,76 @@ class StockMonitor(QtWidgets.QWidget):
         self.scroll_area.setWidget(self.scroll_content)
         self.frame_layout.addWidget(self.scroll_area)
         
+        # 2'. Heatmap / 全市场排行 (和列表三选一，右键菜单切换)
+        self.view_mode = "list"
+        self.heatmap = HeatmapWidget()
+        self.heatmap.hide()
+        self.frame_layout.addWidget(self.heatmap)
+        self.screener_panel = ScreenerPanel()
+        self.screener_panel.hide()
+        self.screener_panel.add_signal.connect(self.add_stock)
+        self.frame_layout.addWidget(self.screener_panel)
+        
         # Stock Items Map
         self.stock_items = {} # code -> widget
         
+        # Tray icon (提醒通知用，showMessage 不阻塞)
+        self.tray = None
+        if QtWidgets.QSystemTrayIcon.isSystemTrayAvailable():
+            self.tray = QtWidgets.QSystemTrayIcon(self.style().standardIcon(QtWidgets.QStyle.SP_ComputerIcon), self)
+            self.tray.show()
+        
         # Context Menu
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.show_context_menu)
 
     def setup_workers(self):
-        self.chart_worker = ChartWorker()
+        # 图表和回填的下载都放到子进程里，GUI 进程只做合并和画图
+        self.fetch_pool = FetchPool(CHART_PROCESS_POOL) if CHART_PROCESS_POOL else None
+        fetch = self.fetch_pool.fetch_bars if self.fetch_pool else None
+        self.chart_worker = ChartWorker(fetch)
         self.chart_worker.chart_signal.connect(self.on_chart_data)
-        self.chart_worker.start()
         
-        self.quote_worker = QuoteWorker(self.stocks)
+        self.quote_worker = QuoteWorker(self.stocks, self.alerts)
         self.quote_worker.quotes_signal.connect(self.on_quote_data)
-        self.quote_worker.start()
+        self.quote_worker.alert_signal.connect(self.on_alerts)
+        self.pump = UpdatePump(self.apply_table, self.apply_chart, self.quote_worker.release_table, self)
+        
+        self.screener_worker = ScreenerWorker()
+        self.screener_worker.ranks_signal.connect(self.screener_panel.update_boards)
         
         # Init List
         self.refresh_stock_list()
+        
+        # 先用上次的快照填充界面，再开始联网
+        self.restore_snapshot()
+        self.chart_worker.start()
+        self.quote_worker.start()
+        self.screener_worker.start()
+
+    def restore_snapshot(self):
+        quotes, charts = load_snapshot()
+        self.chart_cache.update(charts)
+        records = {**quotes.get("stocks", {}), **quotes.get("indices", {})}
+        table = QuoteTable(QuoteLayout(records))
+        table.fill(QuoteColumns.from_records(records))
+        self.apply_table(table, stale=True)
+
+    def save_snapshot(self):
+        buffer = self.quote_worker.buffer
+        table = buffer.copy_latest() if buffer is not None else None
+        if table is None:
+            return
+        quotes = {
+            "stocks": table.to_records([FastFetcher.get_sec_id(code) for code in self.stocks]),
+            "indices": table.to_records(list(INDICES.values())),
+        }
+        charts = {k: v for k, v in self.chart_cache.items() if k[0] in self.stock_items}
+        save_snapshot(quotes, charts)
+
+    def closeEvent(self, event):
+        self.save_snapshot()
+        super().closeEvent(event)
 
     def load_stocks(self):
         config_path = os.path.join(os.path.dirname(__file__), "stock_config.json")
@@ -551,6 +1243,8 @@ class StockMonitor(QtWidgets.QWidget):
             self.scroll_layout.removeWidget(item)
             item.deleteLater()
         self.stock_items.clear()
+        self.quote_worker.full_codes = set() # 新建的行都是折叠状态
+        self.quote_layout = None # 新建的行需要重新计算行号
         
         # Rebuild
         # Remove stretch
@@ -559,47 +1253,92 @@ class StockMonitor(QtWidgets.QWidget):
             del item
             
         for code in self.stocks:
-            item_widget = StockItemWidget(code, self.chart_worker)
+            item_widget = StockItemWidget(code, self.chart_worker, self.chart_cache)
+            item_widget.expand_signal.connect(self.quote_worker.set_full)
             self.scroll_layout.addWidget(item_widget)
             self.stock_items[code] = item_widget
             
         self.scroll_layout.addStretch()
         self.quote_worker.update_stocks(self.stocks)
+        self.heatmap.set_symbols([FastFetcher.get_sec_id(code) for code in self.stocks], self.stocks)
         
         # Update Window Height based on content (Mini mode)
-        self.resize(240, 100 + len(self.stocks) * 35)
+        if self.view_mode == "list":
+            self.resize(240, 100 + len(self.stocks) * 35)
 
-    @Slot(dict)
-    def on_quote_data(self, data):
-        # Update Indices
-        indices = data.get("indices", {})
-        # indices keys are like "1.000001" (market.code)
+    @Slot(object)
+    def on_quote_data(self, table):
+        self.pump.push_table(table)
+
+    def apply_table(self, table, stale=False):
+        # 代码集合变化时才重新计算行号，平时按行号直接读
+        if table.layout is not self.quote_layout:
+            self.quote_layout = table.layout
+            for code, item in self.stock_items.items():
+                item.row = table.row(FastFetcher.get_sec_id(code))
+            self.index_rows = {name: table.row(code) for name, code in INDICES.items()}
+        data = table.data
+        updated = data["updated"]
         
-        for name, code in INDICES.items():
-            if name not in self.index_labels: continue
-            
-            # code in INDICES is already "1.000001" or similar
-            quote = indices.get(code)
-            
-            if quote:
-                pct = quote['pct']
-                color = UP_COLOR if pct >= 0 else DOWN_COLOR
-                self.index_labels[name].setText(f"{name}: {pct:+.2f}%")
-                self.index_labels[name].setStyleSheet(f"color: {color}; font-size: 10px;")
-
-        # Update Stocks
-        stocks = data.get("stocks", {})
-        for code in self.stock_items:
-            # Construct the key used in stocks dict
-            # FastFetcher.get_sec_id returns "1.600519" etc.
-            key = FastFetcher.get_sec_id(code)
-            
-            quote = stocks.get(key)
-            if quote:
-                self.stock_items[code].update_quote(quote)
+        # Update Indices
+        for name, row in self.index_rows.items():
+            if name not in self.index_labels or row < 0 or not updated[row]: continue
+            pct = float(data["pct"][row])
+            color = STALE_COLOR if stale else (UP_COLOR if pct >= 0 else DOWN_COLOR)
+            self.index_labels[name].setText(f"{name}: {pct:+.2f}%")
+            self.index_labels[name].setStyleSheet(f"color: {color}; font-size: 10px;")
+
+        # Update Stocks (列表隐藏时不逐行更新)
+        self.heatmap.update_table(table, stale)
+        if self.view_mode != "list":
+            return
+        for item in self.stock_items.values():
+            if item.row >= 0 and updated[item.row]:
+                item.update_quote(data[item.row], stale)
+
+    def set_view_mode(self, mode):
+        # list / heatmap / screener
+        self.view_mode = mode
+        self.scroll_area.setVisible(mode == "list")
+        self.heatmap.setVisible(mode == "heatmap")
+        self.screener_panel.setVisible(mode == "screener")
+        self.screener_worker.set_active(mode == "screener")
+        if mode == "list":
+            self.resize(240, 100 + len(self.stocks) * 35)
+        else:
+            self.resize(max(self.width(), 320), max(self.height(), 300))
+
+    @Slot(str)
+    def add_stock(self, code):
+        if code and code not in self.stocks:
+            self.stocks.append(code)
+            self.save_stocks()
+            self.refresh_stock_list()
+
+    @Slot(int, int)
+    def on_backfill_progress(self, done, total):
+        if done >= total:
+            self.lbl_status.hide()
+        else:
+            self.lbl_status.setText(f"回填 {done}/{total}")
+            self.lbl_status.show()
+
+    @Slot(list)
+    def on_alerts(self, fired):
+        lines = [f"{name} {describe_rule(rule)}  现价 {price:.2f} ({pct:+.2f}%)" for rule, name, price, pct in fired]
+        text = "\n".join(lines)
+        if self.tray is not None:
+            self.tray.showMessage("价格提醒", text, QtWidgets.QSystemTrayIcon.Information, 5000)
+        else:
+            print(f"Alert: {text}")
 
     @Slot(str, str, object)
     def on_chart_data(self, code, ctype, df):
+        if df is not None:
+            self.chart_cache[(code, ctype)] = df
+        self.pump.push_chart(code, ctype, df)
+
+    def apply_chart(self, code, ctype, df):
         if code in self.stock_items:
             self.stock_items[code].update_chart(ctype, df)
 
@@ -627,27 +1366,80 @@ class StockMonitor(QtWidgets.QWidget):
         add_action = menu.addAction("添加股票")
         del_action = menu.addAction("删除股票")
         menu.addSeparator()
+        heatmap_action = menu.addAction("热力图")
+        heatmap_action.setCheckable(True)
+        heatmap_action.setChecked(self.view_mode == "heatmap")
+        amount_action = menu.addAction("按成交额大小")
+        amount_action.setCheckable(True)
+        amount_action.setChecked(self.heatmap.size_by_amount)
+        amount_action.setEnabled(self.view_mode == "heatmap")
+        screener_action = menu.addAction("市场排行")
+        screener_action.setCheckable(True)
+        screener_action.setChecked(self.view_mode == "screener")
+        menu.addSeparator()
+        backfill_action = menu.addAction("回填历史数据")
+        backfill_action.setEnabled(self.backfill_worker is None or not self.backfill_worker.isRunning())
+        menu.addSeparator()
+        add_alert_action = menu.addAction("添加提醒")
+        del_alert_action = menu.addAction("删除提醒")
+        del_alert_action.setEnabled(bool(self.alerts))
+        menu.addSeparator()
         exit_action = menu.addAction("退出")
         
         action = menu.exec(self.mapToGlobal(pos))
         
         if action == exit_action:
+            self.save_snapshot()
+            if self.backfill_worker is not None:
+                self.backfill_worker.stop()
             self.quote_worker.stop()
             self.chart_worker.stop()
+            self.screener_worker.stop()
+            if self.fetch_pool is not None:
+                self.fetch_pool.close()
             QtWidgets.QApplication.quit()
         elif action == add_action:
-            code, ok = QtWidgets.QInputDialog.getText(self, "添加", "请输入股票代码:")
+            dialog = AddStockDialog(self)
+            ok = dialog.exec() == QtWidgets.QDialog.Accepted
+            code = dialog.selected_code()
             if ok and code:
-                if code not in self.stocks:
-                    self.stocks.append(code)
-                    self.save_stocks()
-                    self.refresh_stock_list()
+                self.add_stock(code)
         elif action == del_action:
             code, ok = QtWidgets.QInputDialog.getText(self, "删除", "请输入要删除的代码:")
             if ok and code in self.stocks:
                 self.stocks.remove(code)
                 self.save_stocks()
                 self.refresh_stock_list()
+        elif action == heatmap_action:
+            self.set_view_mode("heatmap" if heatmap_action.isChecked() else "list")
+        elif action == screener_action:
+            self.set_view_mode("screener" if screener_action.isChecked() else "list")
+        elif action == amount_action:
+            self.heatmap.set_size_by_amount(amount_action.isChecked())
+        elif action == backfill_action:
+            self.backfill_worker = BackfillWorker(self.stocks, self.chart_worker.fetch)
+            self.backfill_worker.progress_signal.connect(self.on_backfill_progress)
+            self.backfill_worker.start()
+        elif action == add_alert_action:
+            text, ok = QtWidgets.QInputDialog.getText(
+                self, "添加提醒",
+                "格式: 代码 条件\n600519 >1800  价格突破\n600519 <1700  价格跌破\n"
+                "600519 %>5  涨幅超过5%\n600519 5m>2  5分钟波动超过2%")
+            if ok and text:
+                rule = parse_rule(text)
+                if rule is None:
+                    QtWidgets.QMessageBox.warning(self, "添加提醒", f"无法识别: {text}")
+                    return
+                self.alerts.append(rule)
+                save_alerts(self.alerts)
+                self.quote_worker.update_alerts(self.alerts)
+        elif action == del_alert_action:
+            items = [f"{i + 1}. {r['code']} {describe_rule(r)}" for i, r in enumerate(self.alerts)]
+            item, ok = QtWidgets.QInputDialog.getItem(self, "删除提醒", "选择要删除的提醒:", items, 0, False)
+            if ok and item in items:
+                del self.alerts[items.index(item)]
+                save_alerts(self.alerts)
+                self.quote_worker.update_alerts(self.alerts)
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
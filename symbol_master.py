@@ -0,0 +1,249 @@
+import os
+import time
+import threading
+
+import numpy as np
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    # 没装 pypinyin 时只是不能按拼音首字母搜索，代码/名称搜索照常
+    lazy_pinyin = None
+
+# -----------------------------------------------------------------------------
+# Symbol Master (代码表)
+# -----------------------------------------------------------------------------
+# 全市场 A 股 / ETF / 指数的代码表，存成定长记录的 .npy 文件，
+# 启动时 mmap 加载，不用每次联网。
+#   code:   6 位代码
+#   market: sh / sz / bj
+#   kind:   0 股票, 1 ETF, 2 指数
+#   name:   名称 (UTF-8)
+#   py:     拼音首字母 (大写)
+SYMBOL_DTYPE = np.dtype([
+    ("code", "S6"),
+    ("market", "S2"),
+    ("kind", "u1"),
+    ("name", "S32"),
+    ("py", "S16"),
+])
+KIND_STOCK, KIND_ETF, KIND_INDEX = 0, 1, 2
+SYMBOL_MASTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "symbol_master.npy")
+SYMBOL_MASTER_TTL = 24 * 3600  # 代码表超过一天就在后台增量刷新
+
+
+def _market_of(code, kind):
+    # 只在建表时使用：股票/ETF 按交易所编码规则推断，指数由数据源直接给出
+    if kind == KIND_ETF:
+        return "sh" if code.startswith("5") else "sz"
+    if code.startswith("92") or code.startswith("8") or code.startswith("4"):
+        return "bj"
+    if code.startswith("6") or code.startswith("9"):
+        return "sh"
+    return "sz"
+
+
+def _initials(name):
+    if lazy_pinyin is None:
+        return ""
+    letters = lazy_pinyin(name, style=Style.FIRST_LETTER, errors="default")
+    return "".join(letters).upper().replace(" ", "")
+
+
+class SymbolMaster:
+    _lock = threading.Lock()
+    _table = None      # SYMBOL_DTYPE 数组，按 (code, kind) 排序
+    _resolve = {}      # 6 位代码 -> "sh600519"
+    _py_order = None   # 按拼音排序的下标
+    _py_sorted = None
+
+    @classmethod
+    def load(cls, path=SYMBOL_MASTER_PATH):
+        """
+        加载本地代码表 (mmap)，文件不存在返回 False
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            table = np.load(path, mmap_mode="r")
+        except Exception as e:
+            print(f"Error loading symbol master: {e}")
+            return False
+        cls._install(table)
+        return True
+
+    @classmethod
+    def _install(cls, table):
+        # 同一个代码既是股票又是指数时 (000001)，表按 kind 排序，股票在前，
+        # 所以裸代码默认解析为股票；指数请用 sh000001 这样的完整代码
+        resolve = {}
+        for code, market in zip(table["code"].tolist(), table["market"].tolist()):
+            code = code.decode()
+            if code not in resolve:
+                resolve[code] = market.decode() + code
+        py_order = np.argsort(table["py"], kind="stable")
+        with cls._lock:
+            cls._table = table
+            cls._resolve = resolve
+            cls._py_order = py_order
+            cls._py_sorted = table["py"][py_order]
+
+    @classmethod
+    def is_loaded(cls):
+        return cls._table is not None
+
+    @classmethod
+    def is_stale(cls, path=SYMBOL_MASTER_PATH):
+        if not os.path.exists(path):
+            return True
+        return time.time() - os.path.getmtime(path) > SYMBOL_MASTER_TTL
+
+    @classmethod
+    def resolve(cls, code):
+        """
+        6 位代码 -> 腾讯格式代码 (sh600519)，查不到返回 None
+        """
+        return cls._resolve.get(code)
+
+    @classmethod
+    def search(cls, query, limit=20):
+        """
+        按代码前缀 / 拼音首字母前缀 / 名称子串搜索
+        返回 [(qt_code, code, name, kind), ...]
+        """
+        # 后台刷新会在 _install 里同时换掉这三个，一起取出来，不混用新旧两版
+        with cls._lock:
+            table, py_order, py_sorted = cls._table, cls._py_order, cls._py_sorted
+        query = query.strip()
+        if table is None or not query:
+            return []
+
+        market = None
+        lower = query.lower()
+        if lower[:2] in ("sh", "sz", "bj") and lower[2:].isdigit():
+            market, query = lower[:2].encode(), lower[2:]
+
+        if query.isdigit():
+            key = query.encode()
+            codes = table["code"]
+            lo = np.searchsorted(codes, key, side="left")
+            hi = np.searchsorted(codes, key + b"\xff", side="left")
+            idx = np.arange(lo, hi)
+            if market is not None:
+                idx = idx[table["market"][idx] == market]
+            idx = idx[:limit]
+        elif query.isascii() and query.isalpha():
+            key = query.upper().encode()
+            lo = np.searchsorted(py_sorted, key, side="left")
+            hi = np.searchsorted(py_sorted, key + b"\xff", side="left")
+            idx = py_order[lo:min(hi, lo + limit)]
+        else:
+            hits = np.char.find(table["name"], query.encode("utf-8")) >= 0
+            idx = np.flatnonzero(hits)[:limit]
+
+        rows = table[idx]
+        results = []
+        for r in rows:
+            code = r["code"].decode()
+            results.append((r["market"].decode() + code, code,
+                            r["name"].decode("utf-8", errors="ignore"), int(r["kind"])))
+        return results
+
+    # -------------------------------------------------------------------------
+    # Build / Refresh
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _fetch_listing():
+        """
+        从 akshare 拉取 A 股 / ETF / 指数列表，返回 ([(code, market, kind, name), ...], 是否全部成功)
+        单个数据源失败不影响其他数据源
+        """
+        import akshare as ak
+
+        rows = []
+        complete = True
+        try:
+            df = ak.stock_info_a_code_name()
+            for code, name in zip(df["code"].astype(str), df["name"].astype(str)):
+                rows.append((code, _market_of(code, KIND_STOCK), KIND_STOCK, name))
+        except Exception as e:
+            print(f"Symbol master: stock list fetch failed: {e}")
+            complete = False
+        try:
+            df = ak.fund_etf_spot_em()
+            for code, name in zip(df["代码"].astype(str), df["名称"].astype(str)):
+                rows.append((code, _market_of(code, KIND_ETF), KIND_ETF, name))
+        except Exception as e:
+            print(f"Symbol master: ETF list fetch failed: {e}")
+            complete = False
+        try:
+            df = ak.stock_zh_index_spot_sina()
+            for qt_code, name in zip(df["代码"].astype(str), df["名称"].astype(str)):
+                rows.append((qt_code[2:], qt_code[:2], KIND_INDEX, name))
+        except Exception as e:
+            print(f"Symbol master: index list fetch failed: {e}")
+            complete = False
+        return rows, complete
+
+    @classmethod
+    def refresh(cls, path=SYMBOL_MASTER_PATH):
+        """
+        增量刷新：新代码追加、改名的更新，已有记录保留；
+        没有变化时只更新文件时间戳。有数据源失败时不把文件标记为最新，下次启动再试
+        """
+        rows, complete = cls._fetch_listing()
+        if not rows:
+            return False
+
+        existing = {}
+        table = cls._table
+        if table is None and os.path.exists(path):
+            try:
+                table = np.load(path)
+            except Exception:
+                table = None
+        if table is not None:
+            for r in table.tolist():
+                existing[(r[0], r[2])] = r
+
+        changed = False
+        for code, market, kind, name in rows:
+            key = (code.encode(), kind)
+            old = existing.get(key)
+            name_b = name.encode("utf-8")[:32]
+            if old is not None and old[1] == market.encode() and old[3] == name_b:
+                continue
+            py = old[4] if old is not None and old[3] == name_b else _initials(name).encode()[:16]
+            existing[key] = (key[0], market.encode(), kind, name_b, py)
+            changed = True
+
+        if not changed:
+            if complete:
+                os.utime(path, None)
+            return False
+
+        new_table = np.array(sorted(existing.values(), key=lambda r: (r[0], r[2])), dtype=SYMBOL_DTYPE)
+        # 先切到内存里的新表，释放旧文件的 mmap (Windows 下被映射的文件不能替换)
+        del table
+        cls._install(new_table)
+        tmp_path = path + ".tmp"
+        stale_mtime = os.path.getmtime(path) if os.path.exists(path) else 0
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, new_table)
+            os.replace(tmp_path, path)
+            if not complete:
+                # 部分数据源失败：保存已拿到的，但保留旧的时间戳，不算刷新过
+                os.utime(path, (stale_mtime, stale_mtime))
+        except Exception as e:
+            print(f"Error saving symbol master: {e}")
+            return False
+        print(f"Symbol master updated: {len(new_table)} symbols")
+        return True
+
+
+if __name__ == "__main__":
+    SymbolMaster.refresh()
+    SymbolMaster.load()
+    for q in ["600519", "000001", "pa", "茅台", "510"]:
+        print(q, SymbolMaster.search(q, limit=5))
@@ -0,0 +1,100 @@
+import numpy as np
+
+from history_store import BAR_DTYPE
+
+# -----------------------------------------------------------------------------
+# Timeframes (多周期 K 线)
+# -----------------------------------------------------------------------------
+# 周 K / 月 K 由本地日线合成，5/15/30/60 分钟由 1 分钟线合成，切换周期不用联网。
+# chart_type -> (基础周期, 合成方式)
+TIMEFRAMES = {
+    "min": ("min1", None),       # 分时，直接用 1 分钟线
+    "5min": ("min1", 5),
+    "15min": ("min1", 15),
+    "30min": ("min1", 30),
+    "60min": ("min1", 60),
+    "daily": ("daily", None),
+    "weekly": ("daily", "W"),
+    "monthly": ("daily", "M"),
+}
+
+
+def base_kind(chart_type):
+    return TIMEFRAMES[chart_type][0]
+
+
+def _group_keys(ts, rule):
+    if rule == "M":
+        return ts.astype("M8[M]").astype(np.int64)
+    days = ts.astype("M8[D]").astype(np.int64)
+    if rule == "W":
+        # 1970-01-01 是周四，+3 后按 7 天取整即以周一为一周开始
+        return (days + 3) // 7
+    # 分钟线：A 股 09:30-11:30, 13:00-15:00，K 线时间为该分钟结束时刻
+    minute = (ts - ts.astype("M8[D]")).astype("m8[m]").astype(np.int64)
+    idx = np.where(minute <= 11 * 60 + 30, minute - (9 * 60 + 30), minute - 13 * 60 + 120)
+    # 09:30 的集合竞价 K 线并入第一根
+    bucket = np.maximum(idx - 1, 0) // rule
+    return days * 1000 + bucket
+
+
+def resample(bars, rule):
+    """
+    向量化 OHLCV 合成，新 K 线的时间取组内最后一根
+    """
+    if not len(bars):
+        return np.zeros(0, dtype=BAR_DTYPE)
+    keys = _group_keys(bars["ts"], rule)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+    out = np.zeros(len(starts), dtype=BAR_DTYPE)
+    out["ts"] = bars["ts"][ends]
+    out["open"] = bars["open"][starts]
+    out["pre_close"] = bars["pre_close"][starts]
+    out["close"] = bars["close"][ends]
+    out["high"] = np.maximum.reduceat(bars["high"], starts)
+    out["low"] = np.minimum.reduceat(bars["low"], starts)
+    out["volume"] = np.add.reduceat(bars["volume"], starts)
+    out["amount"] = np.add.reduceat(bars["amount"], starts)
+    return out
+
+
+class TimeframeCache:
+    """
+    按 (代码, 周期) 缓存合成结果。基础 K 线只是追加或最后一根变化时，
+    只重算最后一组之后的部分。
+    复权因子变化时之前的价格会整体变，所以同时核对第一根和最后一组第一根的收盘价。
+    """
+    _entries = {} # (code, chart_type) -> (第一根 (ts, close), 最后一组第一根 (ts, close), last_start, result)
+
+    @classmethod
+    def get(cls, code, chart_type, base):
+        rule = TIMEFRAMES[chart_type][1]
+        if rule is None:
+            return base
+        key = (code, chart_type)
+        entry = cls._entries.get(key)
+        if entry is not None:
+            first, at_start, last_start, result = entry
+            # 最后一组开始之前的基础 K 线没变，才能增量
+            if last_start < len(base) and cls._mark(base, 0) == first and cls._mark(base, last_start) == at_start:
+                tail = resample(base[last_start:], rule)
+                out = np.concatenate([result[:-1], tail])
+                cls._store(key, base, rule, out, last_start)
+                return out
+        out = resample(base, rule)
+        cls._store(key, base, rule, out, 0)
+        return out
+
+    @classmethod
+    def _store(cls, key, base, rule, out, offset):
+        if not len(base):
+            cls._entries.pop(key, None)
+            return
+        keys = _group_keys(base["ts"][offset:], rule)
+        last_start = offset + int(np.flatnonzero(keys == keys[-1])[0])
+        cls._entries[key] = (cls._mark(base, 0), cls._mark(base, last_start), last_start, out)
+
+    @staticmethod
+    def _mark(base, i):
+        return base["ts"][i], base["close"][i]